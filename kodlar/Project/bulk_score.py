@@ -0,0 +1,218 @@
+# bulk_score.py
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import OUTPUT_DIR, SEQUENCE_LENGTH, BULK_PARTITIONS_PER_WORKER, BULK_READ_CHUNK_ROWS, \
+                   BULK_INFERENCE_BATCH_ROWS
+from feature_engineering import RISK_FEATURE_MAPPINGS, normalize_created_at
+from velocity_features import VELOCITY_FEATURES
+from ip_enrichment import NETWORK_NUMERICAL_FEATURES
+from sharding import ConsistentHashRing
+
+BULK_INPUT_COLUMNS = ['UserId', 'CreatedAt', 'ClientIP', 'MFAMethod', 'Application', 'Browser', 'OS', 'Unit', 'Title']
+BULK_MANIFEST_FILE = '_bulk_manifest.json'
+STAGING_DIR_NAME = '_staging'
+
+# Her çalışan sürecinde bir kez yüklenen varlıklar
+_worker_assets = None
+
+
+def read_input_chunks(input_path, chunk_rows=BULK_READ_CHUNK_ROWS):
+    """
+    CSV veya Parquet arşivini bellek dostu parçalar halinde okur.
+    """
+    if input_path.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(input_path)
+        for record_batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=BULK_INPUT_COLUMNS):
+            yield record_batch.to_pandas()
+    else:
+        yield from pd.read_csv(input_path, usecols=BULK_INPUT_COLUMNS, chunksize=chunk_rows)
+
+
+def stage_partitions(input_path, staging_dir, num_partitions):
+    """
+    Girişi UserId'ye göre bölümlere ayırır; her bölüm kendi klasörüne Parquet parçaları olarak yazılır.
+    Böylece bir kullanıcının tüm geçmişi tek bir bölümde toplanır ve bölümler bağımsız skorlanabilir.
+    """
+    success_marker = os.path.join(staging_dir, '_SUCCESS')
+    if os.path.exists(success_marker):
+        print("Bölümleme daha önce tamamlanmış, atlanıyor.")
+        return
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir) # Yarım kalmış bölümleme baştan yapılır
+
+    ring = ConsistentHashRing(num_partitions)
+    user_partitions = {}
+    for chunk_index, chunk in enumerate(read_input_chunks(input_path)):
+        for user_id in chunk['UserId'].unique():
+            if user_id not in user_partitions:
+                user_partitions[user_id] = ring.shard_for_user(user_id)
+        for partition_id, partition_chunk in chunk.groupby(chunk['UserId'].map(user_partitions)):
+            partition_dir = os.path.join(staging_dir, f'part-{partition_id:05d}')
+            os.makedirs(partition_dir, exist_ok=True)
+            partition_chunk.to_parquet(os.path.join(partition_dir, f'chunk-{chunk_index:06d}.parquet'), index=False)
+        print(f"Bölümleme: {chunk_index + 1}. okuma parçası yazıldı ({len(chunk)} satır).")
+
+    open(success_marker, 'w').close()
+
+
+def build_sequences_vectorized(processed, group_starts, rows, processed_offset):
+    """
+    Kullanıcı ve zaman sıralı satırlar için kayan pencere dizilerini döngüsüz oluşturur.
+    processed, processed_offset satırından başlayan ön işlenmiş vektörlerdir; kullanıcının ilk
+    satırından önceki adımlar create_sequences'taki gibi sıfırla doldurulur.
+    """
+    step_indices = rows[:, None] + np.arange(-(SEQUENCE_LENGTH - 1), 1)
+    is_valid_step = step_indices >= group_starts[rows][:, None]
+    local_indices = np.maximum(step_indices - processed_offset, 0)
+    return processed[local_indices] * is_valid_step[..., None]
+
+
+def _init_worker(output_dir):
+    global _worker_assets
+    import tensorflow as tf
+    # Her süreç kendi çekirdeğini kullansın; TF'nin iş parçacıkları süreçler arasında çakışmasın
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    from scoring import load_assets
+    _worker_assets = load_assets(output_dir)
+
+
+def score_partition(partition_id, staging_dir, out_dir):
+    """
+    Bir bölümü okur, özellikleri eğitimdeki kodla hesaplar ve sonuçları Parquet'e parti parti yazar.
+    Arşiv kullanıcının kendi geçmişi olduğu için kayan pencere durumu bölüm içinde sıfırdan kurulur.
+    """
+    from scoring import prepare_entries, transform_entries
+    from velocity_features import VelocityTracker
+
+    started_at = time.time()
+    assets = dict(_worker_assets, velocity_tracker=VelocityTracker())
+    df = pd.read_parquet(os.path.join(staging_dir, f'part-{partition_id:05d}'))
+    if df.empty:
+        open(os.path.join(out_dir, f'part-{partition_id:05d}.empty'), 'w').close()
+        return partition_id, 0, time.time() - started_at
+    df['CreatedAt'] = normalize_created_at(df['CreatedAt'])
+    df = df.sort_values(by=['UserId', 'CreatedAt'], kind='stable').reset_index(drop=True)
+    df = prepare_entries(df, assets, update_profiles=False)
+
+    # Her satırın kullanıcısının ilk satır indeksi (df kullanıcıya göre sıralı)
+    row_numbers = np.arange(len(df))
+    user_ids = df['UserId'].to_numpy()
+    is_group_start = np.r_[True, user_ids[1:] != user_ids[:-1]]
+    group_starts = np.maximum.accumulate(np.where(is_group_start, row_numbers, 0))
+
+    output_columns = BULK_INPUT_COLUMNS + ['ClientIP_ASN', 'ClientIP_NetworkType'] + list(RISK_FEATURE_MAPPINGS.keys()) + \
+                     NETWORK_NUMERICAL_FEATURES + VELOCITY_FEATURES + ['RiskScore']
+    tmp_path = os.path.join(out_dir, f'part-{partition_id:05d}.parquet.tmp')
+    writer = None
+    try:
+        for chunk_start in range(0, len(df), BULK_INFERENCE_BATCH_ROWS):
+            chunk_end = min(chunk_start + BULK_INFERENCE_BATCH_ROWS, len(df))
+            # Dizi başı için önceki (SEQUENCE_LENGTH - 1) satır da dönüştürülür
+            processed_offset = max(chunk_start - (SEQUENCE_LENGTH - 1), 0)
+            processed = transform_entries(df.iloc[processed_offset:chunk_end], assets).astype(np.float32)
+            sequences = build_sequences_vectorized(processed, group_starts, row_numbers[chunk_start:chunk_end], processed_offset)
+
+            predicted_scaled_scores = assets['model'].predict(sequences, batch_size=1024, verbose=0)
+            predicted_original_scores = assets['target_scaler'].inverse_transform(
+                np.asarray(predicted_scaled_scores).reshape(-1, 1)
+            ).ravel()
+
+            out_chunk = df.iloc[chunk_start:chunk_end][output_columns].copy()
+            out_chunk['PredictedRiskScore'] = predicted_original_scores
+            table = pa.Table.from_pandas(out_chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # Tamamlanan bölüm atomik olarak yerine taşınır; dosyanın varlığı bölümün bittiğini gösterir
+    os.replace(tmp_path, os.path.join(out_dir, f'part-{partition_id:05d}.parquet'))
+    return partition_id, len(df), time.time() - started_at
+
+
+def is_partition_done(out_dir, partition_id):
+    return any(os.path.exists(os.path.join(out_dir, f'part-{partition_id:05d}{suffix}')) for suffix in ['.parquet', '.empty'])
+
+
+def run_bulk_scoring(input_path, out_dir, num_workers=None, num_partitions=None, output_dir=OUTPUT_DIR):
+    num_workers = num_workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Devam ederken aynı giriş ve bölüm sayısının kullanıldığından emin ol
+    manifest_path = os.path.join(out_dir, BULK_MANIFEST_FILE)
+    previous_manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous_manifest = json.load(f)
+    if num_partitions is None:
+        num_partitions = previous_manifest['num_partitions'] if previous_manifest else num_workers * BULK_PARTITIONS_PER_WORKER
+    manifest = {'input_path': os.path.abspath(input_path), 'num_partitions': num_partitions}
+    if previous_manifest is not None:
+        if previous_manifest != manifest:
+            raise ValueError(
+                f"HATA: {out_dir} farklı bir çalıştırmaya ait ({previous_manifest}). "
+                "Devam etmek için aynı giriş ve --partitions değerini kullanın veya yeni bir çıkış klasörü seçin."
+            )
+    else:
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+    if os.path.exists(os.path.join(out_dir, '_SUCCESS')):
+        print(f"{out_dir} için toplu skorlama zaten tamamlanmış.")
+        return
+
+    print("\n--- Toplu Skorlama: Bölümleme ---")
+    staging_dir = os.path.join(out_dir, STAGING_DIR_NAME)
+    stage_partitions(input_path, staging_dir, num_partitions)
+
+    pending_partitions = [
+        partition_id for partition_id in range(num_partitions)
+        if os.path.isdir(os.path.join(staging_dir, f'part-{partition_id:05d}')) and not is_partition_done(out_dir, partition_id)
+    ]
+    print(f"\n--- Toplu Skorlama: {len(pending_partitions)} bölüm {num_workers} süreçle skorlanıyor ---")
+    started_at = time.time()
+    total_rows = 0
+    # TF fork ile güvenli olmadığı için süreçler 'spawn' ile başlatılır
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(output_dir,)) as executor:
+        futures = [executor.submit(score_partition, partition_id, staging_dir, out_dir) for partition_id in pending_partitions]
+        for completed, future in enumerate(as_completed(futures), start=1):
+            partition_id, rows, seconds = future.result()
+            total_rows += rows
+            elapsed = time.time() - started_at
+            print(f"Bölüm {partition_id} tamamlandı: {rows} satır, {seconds:.1f} sn "
+                  f"({completed}/{len(pending_partitions)}, toplam {total_rows / max(elapsed, 1e-9):.0f} satır/sn)")
+
+    elapsed = time.time() - started_at
+    print(f"\nToplu skorlama tamamlandı: {total_rows} satır, {elapsed:.1f} sn, {total_rows / max(elapsed, 1e-9):.0f} satır/sn.")
+    open(os.path.join(out_dir, '_SUCCESS'), 'w').close()
+    shutil.rmtree(staging_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geçmiş giriş arşivlerini tüm çekirdeklerle toplu skorlar.")
+    parser.add_argument('input_path', help="CSV veya .parquet giriş dosyası")
+    parser.add_argument('out_dir', help="Skorlanmış Parquet bölümlerinin yazılacağı klasör")
+    parser.add_argument('--workers', type=int, default=None, help="Süreç sayısı (varsayılan: çekirdek sayısı)")
+    parser.add_argument('--partitions', type=int, default=None, help="UserId bölüm sayısı")
+    args = parser.parse_args()
+    run_bulk_scoring(args.input_path, args.out_dir, num_workers=args.workers, num_partitions=args.partitions)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,21 +16,95 @@ BROWSERS = ['Chrome', 'Firefox', 'Safari', 'Edge']
 OSS = ['Windows', 'macOS', 'Linux', 'iOS', 'Android']
 UNITS = ['HR', 'Finance', 'Engineering', 'Marketing', 'Sales']
 TITLES = ['Manager', 'Analyst', 'Director', 'Specialist', 'Associate']
+NETWORK_TYPES = ['isp', 'mobile', 'hosting', 'corporate']
 
 # Risk Ağırlıkları (Kural Tabanlı Sistem İçin)
+# Toplam kural skoru 1.0 ile sınırlanır (calculate_risk_scores)
 RISK_WEIGHTS = {
     'ip_change': 0.35,
+    'ip_change_same_asn': 0.10, # IP bloğu olağan dışı ama ASN profildekiyle aynı; ip_change yerine uygulanır
+    'asn_change': 0.15,
+    'risky_network': 0.20, # RISKY_NETWORK_TYPES'tan, kullanıcının olağan ASN'i dışından giriş
     'time_anomaly': 0.25,
     'mfa_change': 0.15,
     'browser_os_change': 0.10,
     'application_change': 0.05,
     'unit_change': 0.05,
-    'title_mismatch': 0.05
+    'title_mismatch': 0.05,
+    'login_burst': 0.20, # Pencerede olağan hızın çok üstünde giriş
+    'ip_block_hopping': 0.15, # Pencerede çok sayıda farklı IP bloğu
+    'device_hopping': 0.10 # Pencerede çok sayıda farklı tarayıcı/işletim sistemi
 }
+RISKY_NETWORK_TYPES = ['hosting'] # Barındırma/VPN çıkışları
+
+# Kayan pencere (velocity) davranış özellikleri
+VELOCITY_WINDOW_SECONDS = 3600 # Son 1 saat
+VELOCITY_MAX_EVENTS = 64 # Kullanıcı başına pencerede tutulacak en fazla giriş (halka tampon boyutu)
+VELOCITY_GAP_EWMA_ALPHA = 0.1 # Girişler arası sürenin üstel hareketli ortalaması için katsayı
+VELOCITY_MAX_GAP_HOURS = 24 * 30 # 'Son girişten bu yana geçen saat' için üst sınır
+# Kayan pencere kural eşikleri (RISK_WEIGHTS'teki login_burst, ip_block_hopping, device_hopping)
+RISK_BURST_MIN_LOGINS = 4
+RISK_BURST_MIN_RATE_RATIO = 3.0
+RISK_HOPPING_MIN_IP_BLOCKS = 3
+RISK_HOPPING_MIN_DEVICES = 3
+
+# Öğrenilen kullanıcı profilleri
+PROFILE_HALF_LIFE_DAYS = 30 # Profil sayaçlarının yarı ömrü; eski davranışın etkisi bu sürede yarıya iner
+PROFILE_IP_BLOCK_SLOTS = 4 # Kullanıcı başına izlenen en fazla IP bloğu
+PROFILE_USUAL_IP_MIN_SHARE = 0.2 # Bir IP bloğunun 'olağan' sayılması için toplam ağırlıktaki en düşük payı
+PROFILE_UPDATE_MAX_RISK_SCORE = 0.50 # Yalnızca kural skoru bunun altındaki girişler profile eklenir (saldırganın bloğu/MFA'sı olağanlaşmasın)
+
+# Akış (streaming) skorlayıcı ayarları
+STREAM_QUEUE_MAXSIZE = 10000 # Kaynak ile skorlayıcı arasındaki sınırlı kuyruk (dolunca kaynak okumayı bekletir)
+STREAM_MIN_BATCH_SIZE = 1
+STREAM_MAX_BATCH_SIZE = 512
+STREAM_MAX_BATCH_WAIT_SECONDS = 0.05 # Bir mikro-partiyi doldurmak için beklenecek en uzun süre
+STREAM_CHECKPOINT_INTERVAL_SECONDS = 1.0
+STREAM_METRICS_INTERVAL_SECONDS = 10.0
+
+# Toplu (bulk) skorlama ayarları
+BULK_PARTITIONS_PER_WORKER = 4 # Süreç başına UserId bölümü (devam etme ve yük dengesi için)
+BULK_READ_CHUNK_ROWS = 200000 # Giriş dosyası bu kadar satırlık parçalar halinde okunur
+BULK_INFERENCE_BATCH_ROWS = 8192 # Model tahmini ve Parquet yazımı bu kadar satırlık partilerle yapılır
+
+# Parçalı (sharded) servis ayarları
+NUM_SHARDS = 0 # 0: bölümleme yapılmaz, main.py --num-shards ile değiştirilebilir
+SHARD_VIRTUAL_NODES = 64 # Tutarlı özetleme halkasında parça başına sanal düğüm sayısı
+SHARD_REQUEST_TIMEOUT_SECONDS = 10 # Yönlendiricinin parçalara yaptığı isteklerin zaman aşımı
+ROUTER_CONCURRENT_REQUESTS = 16 # Yönlendiricinin aynı anda parçalara dağıtabileceği istemci isteği sayısı
+
+# Skorlanmış giriş günlüğü (event log) ayarları
+EVENT_LOG_SEGMENT_BYTES = 64 * 1024 * 1024 # Segment bu boyuta ulaşınca yeni segmente geçilir
+EVENT_LOG_GROUP_COMMIT_MAX_RECORDS = 1024 # Tek fsync ile kalıcı hale getirilecek en fazla kayıt
+EVENT_LOG_GROUP_COMMIT_MAX_WAIT_SECONDS = 0.002 # Aynı fsync'e katılmak için diğer istekleri bekleme süresi
+
+# Kayma (drift) izleme ayarları
+DRIFT_NUM_BINS = 20 # Sayısal özellik ve skor histogramları için referans kantil kutusu sayısı
+DRIFT_HALF_LIFE_SECONDS = 6 * 3600 # Canlı sayaçların yarı ömrü; rapor yakın zamandaki trafiğe ağırlık verir
+DRIFT_CMS_DEPTH = 4 # Bilinmeyen kategoriler için count-min sketch satır sayısı
+DRIFT_CMS_WIDTH = 1024 # Count-min sketch sütun sayısı
+DRIFT_HLL_PRECISION = 12 # HyperLogLog register sayısı 2^12 (~%1.6 hata)
+DRIFT_TOP_UNKNOWN_VALUES = 10 # Raporlanacak en sık bilinmeyen kategori sayısı
+DRIFT_PSI_ALERT = 0.25 # PSI bu değeri aşarsa belirgin kayma kabul edilir
+DRIFT_UNKNOWN_RATE_ALERT = 0.05 # Eğitimde görülmemiş kategori oranı için alarm eşiği
+DRIFT_MIN_EVENTS = 100 # Alarm üretmek için gereken en az (sönümlenmiş) olay sayısı
+# Takvime bağlı özellikler: referans tüm döngüyü kapsar, yarı ömrü 6 saat olan canlı sayaçlar ise son birkaç saati;
+# kısa pencerede PSI'ları döngü gereği hep yüksek çıkar. Gün/hafta döngülü olanlar için ayrıca döngüyü kapsayan uzun
+# yarı ömürlü histogram tutulur ve alarm ondan üretilir. Ay (yıllık döngü) için bu kadar uzun durum tutulmaz, alarm üretmez.
+DRIFT_CYCLE_FEATURES = ['CreatedAt_Hour', 'CreatedAt_DayOfWeek', 'is_time_anomaly_feature']
+DRIFT_CYCLE_HALF_LIFE_SECONDS = 14 * 24 * 3600 # Haftanın günleri arasındaki sönüm farkı PSI'yi ~0.01 etkiler
+DRIFT_ALERT_EXEMPT_FEATURES = ['CreatedAt_Month']
 
 # Faker objesi (sahte veri üretimi için)
 fake = Faker()
 
 # Çıktı klasörü (eğer kaydedilecek dosyalar varsa)
 OUTPUT_DIR = 'output'
-os.makedirs(OUTPUT_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+SHARDS_DIR = os.path.join(OUTPUT_DIR, 'shards')
+
+# IP aralık tablosu (CIDR → ASN/ülke/ağ tipi). Dosya yoksa main.py sahte bir tablo üretir.
+IP_RANGES_PATH = os.environ.get('IP_RANGES_PATH', os.path.join(OUTPUT_DIR, 'ip_ranges.csv'))
+
+# Skorlanmış girişlerin yazıldığı günlük klasörü (parçalı modda her parça kendi alt klasörünü kullanır)
+EVENT_LOG_DIR = os.environ.get('EVENT_LOG_DIR', os.path.join(OUTPUT_DIR, 'event_log'))
\ No newline at end of file
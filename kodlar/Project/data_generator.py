@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 import pickle # user_profiles'ı kaydetmek için
 
 from config import NUM_USERS, ENTRIES_PER_USER, RISK_INJECTION_RATE, \
-                   MFA_METHODS, APPLICATIONS, BROWSERS, OSS, UNITS, TITLES, fake, OUTPUT_DIR
+                   MFA_METHODS, APPLICATIONS, BROWSERS, OSS, UNITS, TITLES, NETWORK_TYPES, fake, OUTPUT_DIR, IP_RANGES_PATH
 
 def generate_mock_data():
     """
@@ -59,7 +59,7 @@ def generate_mock_data():
 
 
             if is_risky_scenario:
-                risk_type = random.choice(['ip', 'time', 'mfa', 'browser_os', 'app', 'unit', 'title'])
+                risk_type = random.choice(['ip', 'time', 'mfa', 'browser_os', 'app', 'unit', 'title', 'burst'])
                 if risk_type == 'ip':
                     entry_ip = fake.ipv4_public() # Farklı IP
                 elif risk_type == 'time':
@@ -118,6 +118,14 @@ def generate_mock_data():
                 'IsRisky_Scenario_Gen': 1 if is_risky_scenario else 0 # Mock verideki risk etiketi
             })
 
+            if is_risky_scenario and risk_type == 'burst':
+                # Birkaç dakika içinde farklı IP ve cihazlardan art arda girişler (ör. parola deneme saldırısı)
+                burst_at = created_at
+                for _ in range(random.randint(3, 6)):
+                    burst_at = burst_at + timedelta(minutes=random.randint(1, 10))
+                    all_entries.append(dict(all_entries[-1], CreatedAt=burst_at, ClientIP=fake.ipv4_public(),
+                                            Browser=random.choice(BROWSERS), OS=random.choice(OSS)))
+
     df = pd.DataFrame(all_entries)
     df['CreatedAt'] = pd.to_datetime(df['CreatedAt'])
     # Zaman serisi için sıralama çok önemli
@@ -128,4 +136,23 @@ def generate_mock_data():
         pickle.dump(user_profiles, f)
 
     print(f"Toplam {len(df)} giriş kaydı ve {len(user_profiles)} kullanıcı profili oluşturuldu.")
-    return df, user_profiles
\ No newline at end of file
+    return df, user_profiles
+
+
+def generate_ip_range_table(path=IP_RANGES_PATH, num_asns=400):
+    """
+    Gerçek bir ağ tablosu yoksa kullanılmak üzere sahte bir IP aralık tablosu (CIDR → ASN/ülke/ağ tipi) üretir.
+    Genel IPv4 uzayı /12 bloklara bölünür ve her blok rastgele bir ASN'e atanır.
+    """
+    asn_pool = [
+        (64512 + i, fake.country_code(), random.choices(NETWORK_TYPES, weights=[0.6, 0.15, 0.15, 0.1])[0])
+        for i in range(num_asns)
+    ]
+    rows = []
+    for first_octet in range(1, 224):
+        for block in range(16):
+            asn, country, network_type = random.choice(asn_pool)
+            rows.append({'cidr': f'{first_octet}.{block * 16}.0.0/12', 'asn': asn, 'country': country, 'network_type': network_type})
+
+    pd.DataFrame(rows).to_csv(path, index=False)
+    print(f"{len(rows)} satırlık sahte IP aralık tablosu oluşturuldu: {path}")
\ No newline at end of file
@@ -0,0 +1,299 @@
+# event_log.py
+
+import glob
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from config import EVENT_LOG_DIR, EVENT_LOG_SEGMENT_BYTES, EVENT_LOG_GROUP_COMMIT_MAX_RECORDS, \
+                   EVENT_LOG_GROUP_COMMIT_MAX_WAIT_SECONDS
+from feature_engineering import normalize_created_at
+
+# Kayıt biçimi (little-endian):
+#   başlık : yük uzunluğu (uint32), yükün crc32'si (uint32)
+#   yük    : ham alanlar JSON uzunluğu (uint32) + JSON,
+#            özellik boyutu (uint32), sıfır olmayan özellik sayısı (uint32) + indeksler (uint32) + değerler (float32),
+#            kural skoru (float64), model skoru (float64)
+# Özellikler çoğunlukla one-hot olduğu için yalnızca sıfır olmayan değerler saklanır.
+RECORD_HEADER = struct.Struct('<II')
+LENGTH_PREFIX = struct.Struct('<I')
+FEATURE_HEADER = struct.Struct('<II')
+SCORES = struct.Struct('<dd')
+SEGMENT_PATTERN = 'segment-*.log'
+
+
+def _segment_path(log_dir, segment_index):
+    return os.path.join(log_dir, f'segment-{segment_index:08d}.log')
+
+
+def _list_segments(log_dir):
+    return sorted(glob.glob(os.path.join(log_dir, SEGMENT_PATTERN)))
+
+
+def _fsync_dir(path):
+    # Yeni segment dosyasının dizin girdisinin de kalıcı olması için
+    dir_fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _write_all(f, data):
+    # Tamponsuz dosyada write kısmi yazabilir; kalan baytlar yazılana kadar devam edilir
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view):]
+
+
+def encode_record(raw_fields, features, rule_score, model_score):
+    raw_bytes = json.dumps(raw_fields, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    features = np.asarray(features, dtype=np.float32)
+    nonzero_indices = np.flatnonzero(features).astype(np.uint32)
+    payload = b''.join([
+        LENGTH_PREFIX.pack(len(raw_bytes)), raw_bytes,
+        FEATURE_HEADER.pack(len(features), len(nonzero_indices)),
+        nonzero_indices.tobytes(), features[nonzero_indices].tobytes(),
+        SCORES.pack(float(rule_score), float(model_score))
+    ])
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_payload(buffer, offset):
+    (raw_length,) = LENGTH_PREFIX.unpack_from(buffer, offset)
+    offset += LENGTH_PREFIX.size
+    raw_fields = json.loads(bytes(buffer[offset:offset + raw_length]).decode('utf-8'))
+    offset += raw_length
+    num_features, num_nonzero = FEATURE_HEADER.unpack_from(buffer, offset)
+    offset += FEATURE_HEADER.size
+    nonzero_indices = np.frombuffer(buffer, dtype=np.uint32, count=num_nonzero, offset=offset)
+    offset += num_nonzero * 4
+    features = np.zeros(num_features, dtype=np.float32)
+    features[nonzero_indices] = np.frombuffer(buffer, dtype=np.float32, count=num_nonzero, offset=offset)
+    offset += num_nonzero * 4
+    rule_score, model_score = SCORES.unpack_from(buffer, offset)
+    return {'raw': raw_fields, 'features': features, 'rule_score': rule_score, 'model_score': model_score}
+
+
+def _scan_segment(buffer):
+    """
+    Segmentteki geçerli kayıtların (yük başlangıcı, yük uzunluğu) listesini ve geçerli verinin bittiği
+    konumu döndürür. Yarım yazılmış veya CRC'si tutmayan ilk kayıtta durur.
+    """
+    records = []
+    offset = 0
+    size = len(buffer)
+    while offset + RECORD_HEADER.size <= size:
+        payload_length, crc = RECORD_HEADER.unpack_from(buffer, offset)
+        payload_start = offset + RECORD_HEADER.size
+        if payload_length == 0 or payload_start + payload_length > size:
+            break
+        if zlib.crc32(buffer[payload_start:payload_start + payload_length]) != crc:
+            break
+        records.append((payload_start, payload_length))
+        offset = payload_start + payload_length
+    return records, offset
+
+
+def iter_event_log(log_dir=EVENT_LOG_DIR):
+    """
+    Tüm segmentleri sırayla bellek eşlemeli (mmap) okuyarak kayıtları döndürür.
+    """
+    segments = _list_segments(log_dir)
+    for segment_number, path in enumerate(segments):
+        if os.path.getsize(path) == 0:
+            continue
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            records, valid_end = _scan_segment(buffer)
+            if valid_end < len(buffer) and segment_number < len(segments) - 1:
+                print(f"Uyarı: {path} içinde {valid_end}. bayttan sonra bozuk veri var, segmentin kalanı atlandı.")
+            for payload_start, _ in records:
+                yield _decode_payload(buffer, payload_start)
+
+
+def read_event_log_df(log_dir=EVENT_LOG_DIR):
+    """
+    Günlükteki skorlanmış girişleri yeniden eğitim için DataFrame olarak döndürür.
+    """
+    rows = [dict(record['raw'], LoggedRiskScore=record['rule_score'], LoggedPredictedRiskScore=record['model_score'])
+            for record in iter_event_log(log_dir)]
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df['CreatedAt'] = normalize_created_at(df['CreatedAt'])
+    return df
+
+
+class EventLog:
+    """
+    Skorlanmış girişler için yalnızca sona eklenen (append-only), segmentlere bölünmüş ikili günlük.
+    Eklemeler tek bir yazıcı iş parçacığında toplanır ve birlikte tek fsync ile kalıcı hale getirilir
+    (group commit); append_many kayıtlar diske alınana kadar bekler.
+    """
+
+    def __init__(self, log_dir=EVENT_LOG_DIR, segment_bytes=EVENT_LOG_SEGMENT_BYTES,
+                 max_batch_records=EVENT_LOG_GROUP_COMMIT_MAX_RECORDS,
+                 max_wait_seconds=EVENT_LOG_GROUP_COMMIT_MAX_WAIT_SECONDS):
+        self.log_dir = log_dir
+        self.segment_bytes = segment_bytes
+        self.max_batch_records = max_batch_records
+        self.max_wait_seconds = max_wait_seconds
+        os.makedirs(log_dir, exist_ok=True)
+        self._segment_index, self._file = self._open_active_segment()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _open_active_segment(self):
+        """
+        Son segmenti açar; önceki bir çökmeden kalan yarım kayıt varsa dosya geçerli sona kırpılır.
+        """
+        segments = _list_segments(self.log_dir)
+        if not segments:
+            path = _segment_path(self.log_dir, 0)
+            f = open(path, 'ab', buffering=0)
+            _fsync_dir(self.log_dir)
+            return 0, f
+
+        path = segments[-1]
+        segment_index = int(os.path.basename(path)[len('segment-'):-len('.log')])
+        size = os.path.getsize(path)
+        if size:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                _, valid_end = _scan_segment(buffer)
+            if valid_end < size:
+                print(f"Uyarı: {path} sonundaki {size - valid_end} baytlık yarım kayıt kırpılıyor.")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_end)
+                    os.fsync(f.fileno())
+        return segment_index, open(path, 'ab', buffering=0)
+
+    def _roll_segment(self):
+        # Yeni dosya açılamazsa self._file eski (açık) segment olarak kalır
+        new_file = open(_segment_path(self.log_dir, self._segment_index + 1), 'ab', buffering=0)
+        self._file.close()
+        self._file = new_file
+        self._segment_index += 1
+        _fsync_dir(self.log_dir)
+
+    def _open_fresh_segment(self):
+        segments = _list_segments(self.log_dir)
+        last_index = int(os.path.basename(segments[-1])[len('segment-'):-len('.log')]) if segments else -1
+        new_file = open(_segment_path(self.log_dir, max(last_index, self._segment_index) + 1), 'ab', buffering=0)
+        if not self._file.closed:
+            self._file.close()
+        self._file = new_file
+        self._segment_index = max(last_index, self._segment_index) + 1
+        _fsync_dir(self.log_dir)
+
+    def _write_batch(self, payloads):
+        """
+        Kayıtları segment sınırlarına göre gruplayıp yazar ve fsync eder; dolan segment kapatılmadan önce fsync edilir.
+        """
+        size = self._file.tell()
+        chunk = []
+        for payload in payloads:
+            if size > 0 and size + len(payload) > self.segment_bytes:
+                _write_all(self._file, b''.join(chunk))
+                os.fsync(self._file.fileno())
+                self._roll_segment()
+                chunk, size = [], 0
+            chunk.append(payload)
+            size += len(payload)
+        _write_all(self._file, b''.join(chunk))
+        os.fsync(self._file.fileno())
+
+    def _rollback(self, segment_index, size):
+        """
+        Başarısız grup yazımını geri alır: bu partide açılan segmentler silinir, başlangıç segmenti parti
+        öncesi boyuta kırpılır. Böylece hata bildirilen kayıtlar sonradan kalıcı olmaz ve sonraki (onaylanmış)
+        kayıtlar yarım baytların arkasına yazılmaz. Geri alınamazsa yeni bir segmente geçilir.
+        """
+        try:
+            if self._segment_index != segment_index or self._file.closed:
+                if not self._file.closed:
+                    self._file.close()
+                for extra_index in range(segment_index + 1, self._segment_index + 1):
+                    extra_path = _segment_path(self.log_dir, extra_index)
+                    if os.path.exists(extra_path):
+                        os.remove(extra_path)
+                self._segment_index = segment_index
+                self._file = open(_segment_path(self.log_dir, segment_index), 'ab', buffering=0)
+            os.ftruncate(self._file.fileno(), size)
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            print(f"Uyarı: Olay günlüğü yazımı geri alınamadı ({e}), yeni bir segmente geçiliyor.")
+            try:
+                self._open_fresh_segment()
+            except Exception as fresh_error:
+                # Bir sonraki parti yeniden deneyecek
+                print(f"Uyarı: Olay günlüğü için yeni segment açılamadı ({fresh_error}).")
+
+    def append_many(self, records):
+        """
+        (ham alanlar, özellikler, kural skoru, model skoru) kayıtlarını ekler ve kalıcı olana kadar bekler.
+        """
+        if not records:
+            return
+        payloads = [encode_record(*record) for record in records]
+        request = {'payloads': payloads, 'done': threading.Event(), 'error': None}
+        self._queue.put(request)
+        request['done'].wait()
+        if request['error'] is not None:
+            raise request['error']
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                break
+            batch = [request]
+            record_count = len(request['payloads'])
+
+            # Kısa bir süre daha bekleyip gelen diğer istekleri aynı fsync'e dahil et
+            wait_until = time.monotonic() + self.max_wait_seconds
+            while record_count < self.max_batch_records:
+                remaining = wait_until - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                record_count += len(request['payloads'])
+
+            # Herhangi bir hata yazıcı iş parçacığını durdurmamalı; aksi halde append_many sonsuza kadar bekler
+            try:
+                if self._file.closed:
+                    self._open_fresh_segment()
+                start_segment_index, start_size = self._segment_index, self._file.tell()
+            except Exception as e:
+                for request in batch:
+                    request['error'] = e
+                    request['done'].set()
+                continue
+            try:
+                self._write_batch([payload for request in batch for payload in request['payloads']])
+            except Exception as e:
+                self._rollback(start_segment_index, start_size)
+                for request in batch:
+                    request['error'] = e
+            for request in batch:
+                request['done'].set()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
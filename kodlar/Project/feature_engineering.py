@@ -5,6 +5,32 @@ import numpy as np
 from datetime import datetime, timedelta
 import random
 
+from config import RISKY_NETWORK_TYPES, RISK_BURST_MIN_LOGINS, RISK_BURST_MIN_RATE_RATIO, \
+                   RISK_HOPPING_MIN_IP_BLOCKS, RISK_HOPPING_MIN_DEVICES
+
+def ip_block(ip):
+    # IP'nin /24 bloğu, ör. '10.1.2.5' -> '10.1.2.'
+    return '.'.join(ip.split('.')[:-1]) + '.'
+
+
+def normalize_created_at(created_at):
+    """
+    CreatedAt değerini (veya sütununu) ISO 8601 olarak ayrıştırır, UTC'ye çevirir ve saat dilimi bilgisini atar.
+    Saat dilimi belirtilmemiş değerler UTC kabul edilir, yani değişmeden kalır. Geçersiz değerde ValueError fırlatır.
+    """
+    parsed = pd.to_datetime(created_at, format='ISO8601', utc=True)
+    return parsed.dt.tz_convert(None) if isinstance(parsed, pd.Series) else parsed.tz_convert(None)
+
+
+def epoch_seconds(created_at):
+    """
+    CreatedAt değerini (veya sütununu) UTC epoch saniyesine çevirir. Hız izleyicisi ve profil deposu
+    aynı zaman tabanını kullanır; sütun için numpy dizisi, tek değer için float döndürür.
+    """
+    elapsed = normalize_created_at(created_at) - pd.Timestamp(0)
+    return elapsed.dt.total_seconds().to_numpy() if isinstance(elapsed, pd.Series) else elapsed.total_seconds()
+
+
 # get_risk_feature fonksiyonu
 def get_risk_feature(entry_row, user_profiles_dict, feature_type, current_value=None, profile_key=None):
 
@@ -18,10 +44,12 @@ def get_risk_feature(entry_row, user_profiles_dict, feature_type, current_value=
 
     if feature_type == 'ip_change':
         # IP blok değişikliği için
-        entry_ip_block = '.'.join(entry_row['ClientIP'].split('.')[:-1]) + '.'
+        entry_ip_block = ip_block(entry_row['ClientIP'])
         # user_profile['base_ip'] string formatında, kontrol et
-        profile_ip_block = '.'.join(user_profile['base_ip'].split('.')[:-1]) + '.'
-        if entry_ip_block != profile_ip_block:
+        profile_ip_block = ip_block(user_profile['base_ip'])
+        # Öğrenilmiş profillerde kullanıcının olağan blokları da geçerli sayılır
+        profile_ip_blocks = user_profile.get('usual_ip_blocks') or [profile_ip_block]
+        if entry_ip_block not in profile_ip_blocks:
             is_risky = 1
     
     elif feature_type == 'time_anomaly':
@@ -72,59 +100,141 @@ def get_risk_feature(entry_row, user_profiles_dict, feature_type, current_value=
     return is_risky
 
 
-def apply_feature_engineering(df, user_profiles):
-
-    print("\n--- Özellik Mühendisliği ve Kural Tabanlı Risk Etiketleme Başlıyor ---")
-    
-    # Risk özelliklerini ve bunların nasıl haritalandırılacağını tanımla
-    risk_feature_mappings = {
-        'is_ip_changed_feature': ('ip_change', 'ClientIP', 'base_ip'), # ClientIP ve base_ip'i get_risk_feature kendi işler
-        'is_time_anomaly_feature': ('time_anomaly', 'CreatedAt', 'avg_entry_hour'), # avg_entry_hour doğrudan kullanılmıyor, ancak tutarlılık için var
-        'is_mfa_changed_feature': ('mfa_change', 'MFAMethod', 'preferred_mfa'),
-        'is_browser_os_changed_feature': ('browser_os_change', ('Browser', 'OS'), ('preferred_browser', 'preferred_os')),
-        'is_application_changed_feature': ('application_change', 'Application', 'preferred_app'),
-        'is_unit_changed_feature': ('unit_change', 'Unit', 'unit'),
-        'is_title_mismatch_feature': ('title_mismatch', 'Title', 'title')
-    }
+# Risk özellikleri ve bunların nasıl haritalandırılacağı (eğitim ve servis aynı tanımı kullanır)
+RISK_FEATURE_MAPPINGS = {
+    'is_ip_changed_feature': ('ip_change', 'ClientIP', 'base_ip'), # ClientIP ve base_ip'i get_risk_feature kendi işler
+    'is_time_anomaly_feature': ('time_anomaly', 'CreatedAt', 'avg_entry_hour'), # avg_entry_hour doğrudan kullanılmıyor, ancak tutarlılık için var
+    'is_mfa_changed_feature': ('mfa_change', 'MFAMethod', 'preferred_mfa'),
+    'is_browser_os_changed_feature': ('browser_os_change', ('Browser', 'OS'), ('preferred_browser', 'preferred_os')),
+    'is_application_changed_feature': ('application_change', 'Application', 'preferred_app'),
+    'is_unit_changed_feature': ('unit_change', 'Unit', 'unit'),
+    'is_title_mismatch_feature': ('title_mismatch', 'Title', 'title')
+}
+
+
+# Risk özelliği sütunu → RISK_WEIGHTS anahtarı
+RISK_FEATURE_WEIGHT_KEYS = {
+    'is_ip_changed_feature': 'ip_change',
+    'is_time_anomaly_feature': 'time_anomaly',
+    'is_mfa_changed_feature': 'mfa_change',
+    'is_browser_os_changed_feature': 'browser_os_change',
+    'is_application_changed_feature': 'application_change',
+    'is_unit_changed_feature': 'unit_change',
+    'is_title_mismatch_feature': 'title_mismatch',
+    'is_asn_changed_feature': 'asn_change' # ip_enrichment.add_network_features ekler
+}
+
+
+def add_risk_features(df, user_profiles, risk_feature_mappings):
+    """
+    risk_feature_mappings'teki her risk özelliğini DataFrame'e sütun olarak ekler.
+    Sonuç get_risk_feature'ın satır satır verdiğiyle aynıdır; ancak profiller kullanıcı başına bir kez okunur
+    ve karşılaştırmalar sütun bazında yapılır (toplu skorlamada satır başına apply darboğazdı).
+    """
+    user_ids = df['UserId'].to_numpy()
+    profiles = {user_id: user_profiles[user_id] for user_id in pd.unique(user_ids) if user_id in user_profiles}
+    # Profili olmayan kullanıcı için risk yok varsayılır (get_risk_feature ile aynı)
+    has_profile = df['UserId'].isin(list(profiles)).to_numpy()
+
+    def profile_values(key):
+        return df['UserId'].map({user_id: profile[key] for user_id, profile in profiles.items()}).to_numpy()
 
-    # Her bir risk özelliğini DataFrame'e ekle
     for col_name, (feature_type, current_col, profile_key) in risk_feature_mappings.items():
-        if feature_type in ['ip_change', 'time_anomaly']: 
-            df[col_name] = df.apply(lambda row: get_risk_feature(row, user_profiles, feature_type), axis=1)
+        if not profiles:
+            is_risky = np.zeros(len(df), dtype=bool)
+        elif feature_type == 'ip_change':
+            entry_ip_blocks = df['ClientIP_Block'] if 'ClientIP_Block' in df else df['ClientIP'].map(ip_block)
+            usual_pairs = pd.MultiIndex.from_tuples([
+                (user_id, usual_ip_block) for user_id, profile in profiles.items()
+                for usual_ip_block in (profile.get('usual_ip_blocks') or [ip_block(profile['base_ip'])])
+            ])
+            is_risky = ~pd.MultiIndex.from_arrays([user_ids, entry_ip_blocks.to_numpy()]).isin(usual_pairs)
+        elif feature_type == 'time_anomaly':
+            # Gece saati (00:00-06:00 veya 22:00-24:00) ya da hafta sonu (Cumartesi=5, Pazar=6)
+            entry_hours = df['CreatedAt'].dt.hour.to_numpy()
+            is_risky = (entry_hours < 6) | (entry_hours >= 22) | (df['CreatedAt'].dt.dayofweek.to_numpy() >= 5)
         elif isinstance(current_col, tuple): # Birden fazla sütuna bağlı olanlar
-            df[col_name] = df.apply(lambda row: get_risk_feature(row, user_profiles, feature_type, 
-                                                                 current_value=(row[current_col[0]], row[current_col[1]]),
-                                                                 profile_key=(profile_key[0], profile_key[1])), axis=1)
+            is_risky = (df[current_col[0]].to_numpy() != profile_values(profile_key[0])) | \
+                       (df[current_col[1]].to_numpy() != profile_values(profile_key[1]))
         else: # Tek bir sütuna bağlı olanlar
-            df[col_name] = df.apply(lambda row: get_risk_feature(row, user_profiles, feature_type, 
-                                                                 current_value=row[current_col], 
-                                                                 profile_key=profile_key), axis=1)
+            is_risky = df[current_col].to_numpy() != profile_values(profile_key)
+        df[col_name] = (np.asarray(is_risky, dtype=bool) & has_profile).astype(int)
+    return df
+
+
+def add_time_and_ip_features(df):
+    """
+    Zaman (saat, haftanın günü, ay) ve IP blok sütunlarını ekler.
+    """
+    df['CreatedAt_Hour'] = df['CreatedAt'].dt.hour
+    df['CreatedAt_DayOfWeek'] = df['CreatedAt'].dt.dayofweek
+    df['CreatedAt_Month'] = df['CreatedAt'].dt.month
+    df['ClientIP_Block'] = df['ClientIP'].apply(ip_block)
+    return df
+
+
+def apply_feature_engineering(df, user_profiles):
+
+    print("\n--- Özellik Mühendisliği ve Kural Tabanlı Risk Etiketleme Başlıyor ---")
     
+    risk_feature_mappings = dict(RISK_FEATURE_MAPPINGS)
 
+    # Her bir risk özelliğini DataFrame'e ekle
+    df = add_risk_features(df, user_profiles, risk_feature_mappings)
 
     return df, risk_feature_mappings
 
 
+def risk_rule_flags(values):
+    """
+    Kural skoruna giren bayrakları {RISK_WEIGHTS anahtarı: bayrak} olarak döndürür. values tek bir satır (Series)
+    ya da DataFrame olabilir; bayraklar buna göre tekil değer ya da dizi olur. Sütunu olmayan kurallar atlanır.
+    """
+    flags = {}
+    for feature_col_name, weight_key in RISK_FEATURE_WEIGHT_KEYS.items():
+        if feature_col_name in values:
+            flags[weight_key] = np.asarray(values[feature_col_name]) == 1
+
+    if 'ClientIP_ASN' in values and 'ProfileIP_ASN' in values:
+        asns = np.asarray(values['ClientIP_ASN'])
+        same_asn = (asns != 0) & (asns == np.asarray(values['ProfileIP_ASN']))
+        if 'ip_change' in flags:
+            # Aynı ISS/kurum içinde /24 bloğu değişen giriş (DHCP, NAT havuzu) tam IP değişikliği sayılmaz
+            flags['ip_change_same_asn'] = flags['ip_change'] & same_asn
+            flags['ip_change'] = flags['ip_change'] & ~same_asn
+        if 'ClientIP_NetworkType' in values:
+            flags['risky_network'] = np.isin(np.asarray(values['ClientIP_NetworkType'], dtype=object),
+                                             RISKY_NETWORK_TYPES) & ~same_asn
+
+    # Kayan pencere kuralları (velocity_features.add_velocity_features ekler)
+    if 'velocity_logins_window' in values and 'velocity_login_rate_ratio' in values:
+        flags['login_burst'] = (np.asarray(values['velocity_logins_window']) >= RISK_BURST_MIN_LOGINS) & \
+                               (np.asarray(values['velocity_login_rate_ratio']) >= RISK_BURST_MIN_RATE_RATIO)
+    if 'velocity_distinct_ip_blocks_window' in values:
+        flags['ip_block_hopping'] = np.asarray(values['velocity_distinct_ip_blocks_window']) >= RISK_HOPPING_MIN_IP_BLOCKS
+    if 'velocity_distinct_devices_window' in values:
+        flags['device_hopping'] = np.asarray(values['velocity_distinct_devices_window']) >= RISK_HOPPING_MIN_DEVICES
+    return flags
+
+
 def calculate_risk_score(row, weights, risk_feature_mappings):
 
     score = 0.0
 
-    # Risk özelliklerini içeren sütunlar ve weights'deki karşılıkları için bir mapping
-    feature_to_weight_key = {
-        'is_ip_changed_feature': 'ip_change',
-        'is_time_anomaly_feature': 'time_anomaly',
-        'is_mfa_changed_feature': 'mfa_change',
-        'is_browser_os_changed_feature': 'browser_os_change',
-        'is_application_changed_feature': 'application_change',
-        'is_unit_changed_feature': 'unit_change',
-        'is_title_mismatch_feature': 'title_mismatch'
-    }
-
-    for feature_col_name, weight_key in feature_to_weight_key.items():
-        # Eğer row'da bu özellik sütunu varsa VE değeri 1 ise (yani riskli ise)
-        if feature_col_name in row and row[feature_col_name] == 1:
-            if weight_key in weights: # İlgili ağırlık config'de tanımlı mı kontrol et
-                score += weights[weight_key]
+    for weight_key, is_risky in risk_rule_flags(row).items():
+        if is_risky and weight_key in weights: # İlgili ağırlık config'de tanımlı mı kontrol et
+            score += weights[weight_key]
 
-    
-    return score
\ No newline at end of file
+    return min(score, 1.0)
+
+
+def calculate_risk_scores(df, weights):
+    """
+    calculate_risk_score'un sütun bazlı hali: tüm satırların kural skorunu numpy dizisi olarak döndürür.
+    Ağırlıklar aynı sırayla toplandığı için sonuç satır satır hesaplananla birebir aynıdır.
+    """
+    scores = np.zeros(len(df))
+    for weight_key, is_risky in risk_rule_flags(df).items():
+        if weight_key in weights:
+            scores = scores + np.where(is_risky, weights[weight_key], 0.0)
+    return np.minimum(scores, 1.0)
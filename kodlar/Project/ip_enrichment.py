@@ -0,0 +1,178 @@
+# ip_enrichment.py
+
+import numpy as np
+import pandas as pd
+
+from config import IP_RANGES_PATH
+
+UNKNOWN_NETWORK = 'unknown'
+
+# Modele giren ağ özellikleri
+NETWORK_NUMERICAL_FEATURES = ['is_asn_changed_feature'] # Girişin ASN'i kullanıcının olağan IP bloğunun ASN'inden farklı mı
+NETWORK_CATEGORICAL_FEATURES = ['ClientIP_NetworkType'] # isp, mobile, hosting, corporate veya unknown
+
+def ip_to_int_array(ips):
+    """
+    Noktalı IPv4 dizelerini döngüsüz olarak tamsayıya (int64) çevirir; geçersiz olanlar -1 olur.
+    Dizeler 16 baytlık sabit genişlikli bir karakter matrisine alınır ve karakter konumu başına
+    (en fazla 15 adım) tüm satırlar birlikte ayrıştırılır.
+    """
+    ips = np.asarray(ips, dtype=object)
+    try:
+        raw = ips.astype('S16')
+    except UnicodeEncodeError:
+        raw = np.array([str(ip).encode('ascii', errors='replace') for ip in ips], dtype='S16')
+    # (16, n) bitişik matris: her adım tek bir karakter konumunu tüm satırlar için işler
+    columns = np.ascontiguousarray(raw.view(np.uint8).reshape(len(ips), 16).T)
+
+    ip_ints = np.zeros(len(ips), dtype=np.int64)
+    current_octet = np.zeros(len(ips), dtype=np.int64)
+    octet_digit_counts = np.zeros(len(ips), dtype=np.int8)
+    dot_counts = np.zeros(len(ips), dtype=np.int8)
+    seen_padding = np.zeros(len(ips), dtype=bool)
+    is_valid = columns[15] == 0 # 15 karakterden uzun dize geçerli bir IPv4 olamaz
+
+    for char in columns[:15]:
+        digit = char - np.uint8(ord('0')) # uint8 taşması sayesinde rakam olmayanlar 9'dan büyük olur
+        is_digit = digit <= 9
+        is_dot = char == ord('.')
+        is_padding = char == 0
+        is_valid &= (is_digit | is_dot | is_padding) & (is_padding | ~seen_padding)
+        seen_padding |= is_padding
+
+        current_octet = np.where(is_digit, current_octet * 10 + digit, current_octet)
+        octet_digit_counts += is_digit
+
+        # Nokta: oktet tamamlanır, doğrulanır ve sonuca eklenir
+        is_valid &= ~is_dot | ((octet_digit_counts >= 1) & (octet_digit_counts <= 3) & (current_octet <= 255))
+        ip_ints = np.where(is_dot, (ip_ints << 8) | current_octet, ip_ints)
+        current_octet = np.where(is_dot, 0, current_octet)
+        octet_digit_counts = np.where(is_dot, 0, octet_digit_counts)
+        dot_counts += is_dot
+
+    # Son oktet
+    is_valid &= (dot_counts == 3) & (octet_digit_counts >= 1) & (octet_digit_counts <= 3) & (current_octet <= 255)
+    ip_ints = (ip_ints << 8) | current_octet
+    return np.where(is_valid, ip_ints, -1)
+
+
+class IpRangeIndex:
+    """
+    CIDR → ASN/ülke/ağ tipi tablosunu sıralı, çakışmasız tamsayı aralıklarına çevirir.
+    Toplu sorgular np.searchsorted ile ikili arama yapar.
+    """
+
+    def __init__(self, starts, ends, asns, countries, network_types):
+        self.starts = starts
+        self.ends = ends
+        self.asns = asns
+        self.countries = countries
+        self.network_types = network_types
+        self._asns = np.append(asns, 0)
+        self._countries = np.append(countries, UNKNOWN_NETWORK).astype(object)
+        self._network_types = np.append(network_types, UNKNOWN_NETWORK).astype(object)
+
+    @classmethod
+    def from_csv(cls, path=IP_RANGES_PATH):
+        """
+        'cidr,asn,country,network_type' sütunlu CSV'yi yükler. ASN 'AS13335' veya '13335' biçiminde olabilir.
+        IPv6, hatalı CIDR ve ASN'i boş/sayı olmayan satırlar atlanır.
+        İç içe aralıklarda daha dar (daha özel) aralık önceliklidir.
+        """
+        table = pd.read_csv(path, dtype={'cidr': str, 'asn': str, 'country': str, 'network_type': str})
+        cidr_parts = table['cidr'].str.split('/', n=1, expand=True)
+        network_ints = ip_to_int_array(cidr_parts[0].to_numpy())
+        prefix_lengths = pd.to_numeric(cidr_parts[1], errors='coerce').fillna(-1).astype(np.int64).to_numpy()
+        asns = pd.to_numeric(table['asn'].str.strip().str.replace(r'^[Aa][Ss]', '', regex=True), errors='coerce')
+        table['asn'] = asns.where(asns % 1 == 0).fillna(-1).astype(np.int64) # Tam sayı olmayan ASN de geçersiz
+
+        is_valid = (network_ints >= 0) & (prefix_lengths >= 0) & (prefix_lengths <= 32) & \
+                   (table['asn'] >= 0).to_numpy()
+        if not is_valid.all():
+            print(f"Uyarı: {path} içindeki {(~is_valid).sum()} satır geçersiz veya IPv6 olduğu için atlandı.")
+        table = table[is_valid].reset_index(drop=True)
+        host_masks = (np.int64(1) << (32 - prefix_lengths[is_valid])) - 1
+        starts = network_ints[is_valid] & ~host_masks
+        ends = starts | host_masks
+
+        segment_starts, segment_ends, segment_rows = _flatten_ranges(starts, ends)
+        return cls(
+            np.asarray(segment_starts, dtype=np.int64),
+            np.asarray(segment_ends, dtype=np.int64),
+            table['asn'].to_numpy(dtype=np.int64)[segment_rows],
+            table['country'].fillna(UNKNOWN_NETWORK).to_numpy(dtype=object)[segment_rows],
+            table['network_type'].fillna(UNKNOWN_NETWORK).to_numpy(dtype=object)[segment_rows]
+        )
+
+    def lookup(self, ips):
+        """
+        IP dizeleri için (asn, ülke, ağ tipi) dizilerini döndürür; bulunamayanlar 0 / 'unknown' olur.
+        """
+        ip_ints = ip_to_int_array(ips)
+        if not len(self.starts):
+            return np.zeros(len(ip_ints), dtype=np.int64), np.full(len(ip_ints), UNKNOWN_NETWORK, dtype=object), \
+                   np.full(len(ip_ints), UNKNOWN_NETWORK, dtype=object)
+
+        positions = np.searchsorted(self.starts, ip_ints, side='right') - 1
+        is_hit = (positions >= 0) & (ip_ints >= 0) & (ip_ints <= self.ends[np.maximum(positions, 0)])
+        # Bulunamayanlar, tabloların sonuna eklenmiş 'bilinmiyor' kaydını gösterir
+        positions = np.where(is_hit, positions, len(self.starts))
+        return self._asns[positions], self._countries[positions], self._network_types[positions]
+
+
+def _flatten_ranges(starts, ends):
+    """
+    İç içe olabilen aralıkları, her noktayı onu kapsayan en dar aralığa bağlayan çakışmasız parçalara böler.
+    Yükleme sırasında bir kez çalışır.
+    """
+    order = np.lexsort((-ends, starts)) # Başlangıca göre artan; aynı başlangıçta önce geniş aralık
+    segment_starts, segment_ends, segment_rows = [], [], []
+
+    def emit(segment_start, segment_end, row):
+        if segment_start <= segment_end:
+            segment_starts.append(segment_start)
+            segment_ends.append(segment_end)
+            segment_rows.append(row)
+
+    open_ranges = [] # (bitiş, satır) yığını; en üstteki en dar açık aralık
+    cursor = 0
+    for row in order:
+        start, end = int(starts[row]), int(ends[row])
+        while open_ranges and open_ranges[-1][0] < start:
+            closed_end, closed_row = open_ranges.pop()
+            emit(cursor, closed_end, closed_row)
+            cursor = closed_end + 1
+        if open_ranges:
+            emit(cursor, start - 1, open_ranges[-1][1])
+        open_ranges.append((end, row))
+        cursor = start
+    while open_ranges:
+        closed_end, closed_row = open_ranges.pop()
+        emit(cursor, closed_end, closed_row)
+        cursor = closed_end + 1
+
+    return segment_starts, segment_ends, np.asarray(segment_rows, dtype=np.int64)
+
+
+def add_network_features(df, ip_range_index, user_profiles):
+    """
+    ClientIP_ASN, ClientIP_NetworkType ve is_asn_changed_feature sütunlarını ekler; ProfileIP_ASN (profil bloğunun
+    ASN'i, bilinmiyorsa 0) model girdisi değildir, kural skoru için eklenir.
+    ASN değişikliği, girişin ASN'inin kullanıcının profilindeki base_ip bloğunun ASN'i ile karşılaştırılmasıdır;
+    aynı ISS/kurum içindeki IP değişiklikleri böylece riskli görünmez.
+    """
+    asns, _, network_types = ip_range_index.lookup(df['ClientIP'].to_numpy())
+
+    # Profil IP bloğu 'a.b.c.' biçimindedir; bloğun ilk adresi ile aranır
+    unique_user_ids = pd.unique(df['UserId'].to_numpy())
+    profile_ips = df['UserId'].map({
+        user_id: user_profiles[user_id]['base_ip'] + '0' for user_id in unique_user_ids if user_id in user_profiles
+    }).fillna('').to_numpy()
+    profile_asns, _, _ = ip_range_index.lookup(profile_ips)
+
+    df['ClientIP_ASN'] = asns
+    df['ClientIP_NetworkType'] = network_types
+    df['ProfileIP_ASN'] = profile_asns
+    # Profil ASN'i bilinmiyorsa karşılaştırma yapılamaz, risk yok varsayılır
+    df['is_asn_changed_feature'] = ((profile_asns != 0) & (asns != profile_asns)).astype(int)
+    return df
@@ -1,33 +1,132 @@
 # main.py
 
+import argparse
+import glob
 import os
+import time
 import pandas as pd
 import numpy as np
 import pickle
 import tensorflow as tf 
 
 # Kendi modüllerimizi içe aktarıyoruz
-from config import SEQUENCE_LENGTH, OUTPUT_DIR, RISK_WEIGHTS
-from data_generator import generate_mock_data
-from feature_engineering import apply_feature_engineering, calculate_risk_score
+from config import SEQUENCE_LENGTH, OUTPUT_DIR, RISK_WEIGHTS, NUM_SHARDS, IP_RANGES_PATH, EVENT_LOG_DIR, \
+                   PROFILE_UPDATE_MAX_RISK_SCORE, SHARDS_DIR
+from data_generator import generate_mock_data, generate_ip_range_table
+from feature_engineering import RISK_FEATURE_MAPPINGS, add_risk_features, calculate_risk_scores, add_time_and_ip_features
+from velocity_features import VelocityTracker, add_velocity_features
+from ip_enrichment import IpRangeIndex, add_network_features
+from profile_builder import ProfileStore
 from preprocessing import create_preprocessors, create_sequences
 from model_builder import build_and_train_model, evaluate_model_r2
+from sharding import partition_assets, load_shard_ring, SHARD_MANIFEST_FILE
+from scoring import REQUIRED_ENTRY_KEYS
+from event_log import read_event_log_df
+from monitoring import DriftMonitor
+
+HISTORY_COLUMNS = REQUIRED_ENTRY_KEYS + ['CreatedAt', 'IsRisky_Scenario_Gen']
+
+def event_log_dirs(log_dir):
+    # Parçalı modda her parçanın günlüğü log_dir altındaki shard_N klasöründedir
+    return [log_dir] + sorted(glob.glob(os.path.join(log_dir, 'shard_*')))
+
+def load_history_with_event_log(log_dir):
+    """
+    Önceki eğitimin giriş kayıtlarını (initial_df) ve o zamandan beri skorlanmış olay günlüğünü birleştirir.
+    Akış skorlayıcı en az bir kez teslim ettiği için tekrarlanan girişler atılır.
+    """
+    frames = []
+    initial_df_path = os.path.join(OUTPUT_DIR, 'initial_df.pkl')
+    if os.path.exists(initial_df_path):
+        frames.append(pd.read_pickle(initial_df_path)[HISTORY_COLUMNS])
+    for path in event_log_dirs(log_dir):
+        log_df = read_event_log_df(path)
+        if not log_df.empty:
+            log_df['IsRisky_Scenario_Gen'] = 0
+            frames.append(log_df[HISTORY_COLUMNS])
+            print(f"{path}: olay günlüğünden {len(log_df)} skorlanmış giriş okundu.")
+    if not frames:
+        raise FileNotFoundError(f"HATA: {initial_df_path} ve {log_dir} içinde eğitim için giriş kaydı bulunamadı.")
+
+    df = pd.concat(frames, ignore_index=True).drop_duplicates(subset=REQUIRED_ENTRY_KEYS + ['CreatedAt'])
+    return df.sort_values(by=['UserId', 'CreatedAt'], kind='stable').reset_index(drop=True)
+
+def label_history_point_in_time(df, ip_range_index, risk_feature_mappings):
+    """
+    Profile bağlı özellikleri ve kural skorunu (hedef) servisteki gibi zamanda ilerleyerek hesaplar: her giriş,
+    kullanıcının yalnızca kendisinden önceki girişlerinden öğrenilmiş profiliyle değerlendirilir ve kural skoru
+    PROFILE_UPDATE_MAX_RISK_SCORE altındaysa profile eklenir. Profiller kullanıcıya özel olduğundan tüm kullanıcıların
+    k. girişleri tek bir vektörel adımda işlenir. df kullanıcı ve zaman sıralı olmalı, kayan pencere özellikleri
+    önceden eklenmiş olmalıdır. Etiketlenmiş girişleri ve son profilleri döndürür.
+    """
+    user_profiles = ProfileStore()
+    entry_ranks = df.groupby('UserId', sort=False).cumcount().to_numpy()
+    labeled_rounds = []
+    for rank in range(entry_ranks.max() + 1 if len(df) else 0):
+        round_df = df[entry_ranks == rank].copy()
+        round_df = add_network_features(round_df, ip_range_index, user_profiles)
+        round_df = add_risk_features(round_df, user_profiles, risk_feature_mappings)
+        round_df['RiskScore'] = calculate_risk_scores(round_df, RISK_WEIGHTS)
+        user_profiles.update_from_entries(round_df[round_df['RiskScore'] < PROFILE_UPDATE_MAX_RISK_SCORE])
+        labeled_rounds.append(round_df)
+    return pd.concat(labeled_rounds).sort_index(), user_profiles
+
+def archive_event_log(log_dir):
+    # Günlükteki girişler artık yeni initial_df'te; yeniden başlatmada tekrar oynatılmasınlar
+    if os.path.isdir(log_dir):
+        archived_dir = f"{log_dir}.trained-{time.strftime('%Y%m%d%H%M%S')}"
+        os.replace(log_dir, archived_dir)
+        print(f"Kullanılan olay günlüğü {archived_dir} klasörüne taşındı.")
+
+def resolve_num_shards(num_shards, event_log_dir):
+    """
+    Olay günlüğüyle yeniden eğitimde parça sayısı verilmemişse mevcut manifest'teki sayı kullanılır.
+    Aksi halde günlük arşivlenir ama parça varlıkları eski kalırdı; manifest yoksa ve günlük parçalıysa durulur.
+    """
+    if not event_log_dir or num_shards > 0:
+        return num_shards
+    if os.path.exists(os.path.join(SHARDS_DIR, SHARD_MANIFEST_FILE)):
+        num_shards = load_shard_ring(SHARDS_DIR).num_shards
+        print(f"Parça sayısı mevcut manifest'ten alındı: {num_shards}")
+        return num_shards
+    if len(event_log_dirs(event_log_dir)) > 1:
+        raise ValueError(
+            f"HATA: {event_log_dir} parçalı servis günlükleri içeriyor ancak parça manifest'i bulunamadı. "
+            "Günlük arşivlenmeden önce parça varlıklarının da yenilenmesi için --num-shards N verin."
+        )
+    return num_shards
+
+def train_and_save_all_assets(num_shards=NUM_SHARDS, event_log_dir=None):
+
+    # Eğitime başlamadan önce: parça sayısı çözülemiyorsa günlük arşivlenmeden durulur
+    num_shards = resolve_num_shards(num_shards, event_log_dir)
+
+    if event_log_dir:
+        print("Giriş kayıtları önceki eğitim verisi ve olay günlüğünden okunuyor...")
+        df = load_history_with_event_log(event_log_dir)
+    else:
+        print("Kullanıcı profilleri ve giriş kayıtları oluşturuluyor...")
+        df, _ = generate_mock_data()
 
-def train_and_save_all_assets():
+    print("\n--- Özellik Mühendisliği ve Kural Tabanlı Risk Etiketleme Başlıyor ---")
+    df = add_time_and_ip_features(df.copy())
 
-    print("Kullanıcı profilleri ve giriş kayıtları oluşturuluyor...")
-    df, user_profiles = generate_mock_data()
-    print(f"Toplam {len(df)} giriş kaydı ve {len(user_profiles)} kullanıcı profili oluşturuldu.")
+    # Kayan pencere özellikleri: df kullanıcı ve zaman sıralı olduğu için olaylar sırasıyla işlenir.
+    # Aynı izleyici kaydedilir ve servis tarafında kaldığı yerden güncellenmeye devam eder.
+    velocity_tracker = VelocityTracker()
+    df = add_velocity_features(df, velocity_tracker)
 
-    print("\n--- Özellik Mühendisliği ve Kural Tabanlı Risk Etiketleme Başlıyor ---")
-    df, risk_feature_mappings = apply_feature_engineering(df.copy(), user_profiles)
-    df['RiskScore'] = df.apply(lambda row: calculate_risk_score(row, RISK_WEIGHTS, risk_feature_mappings), axis=1)
-    
+    # Ağ (ASN/ağ tipi) zenginleştirmesi; gerçek tablo yoksa sahte bir tablo üretilir
+    if not os.path.exists(IP_RANGES_PATH):
+        generate_ip_range_table(IP_RANGES_PATH)
+    ip_range_index = IpRangeIndex.from_csv(IP_RANGES_PATH)
 
-    df['CreatedAt_Hour'] = df['CreatedAt'].dt.hour
-    df['CreatedAt_DayOfWeek'] = df['CreatedAt'].dt.dayofweek
-    df['CreatedAt_Month'] = df['CreatedAt'].dt.month
-    df['ClientIP_Block'] = df['ClientIP'].apply(lambda x: '.'.join(x.split('.')[:-1]) + '.')
+    # Profiller, üretecin rastgele tercihleri yerine gözlenen geçmişten öğrenilir. Tüm geçmişten bir kerede
+    # öğrenilseydi her satır kendi geleceğini görürdü; servisteki gibi girişten önceki profil kullanılır
+    # ve riskli bulunan girişler profile katılmaz.
+    risk_feature_mappings = dict(RISK_FEATURE_MAPPINGS)
+    df, user_profiles = label_history_point_in_time(df, ip_range_index, risk_feature_mappings)
+    print(f"Toplam {len(df)} giriş kaydı ve geçmişten {len(user_profiles)} kullanıcı profili öğrenildi.")
 
     print("Özellik mühendisliği tamamlandı.")
 
@@ -47,6 +146,12 @@ def train_and_save_all_assets():
     r2 = evaluate_model_r2(model, X_test_seq, y_test_seq_scaled, target_scaler)
     print(f"Model R2 Skoru: {r2:.4f}")
 
+    # Kayma izleme için referans: özellik dağılımları eğitim verisinden, skor dağılımları test setinden
+    y_test_pred_original = target_scaler.inverse_transform(model.predict(X_test_seq, verbose=0))
+    y_test_original = target_scaler.inverse_transform(y_test_seq_scaled.reshape(-1, 1))
+    drift_reference = DriftMonitor.from_training(df, numerical_features, categorical_features_for_preprocessing, preprocessor,
+                                                 y_test_original, y_test_pred_original)
+
     # Modeli, preprocessor'ı, scaler'ı ve diğer gerekli nesneleri kaydet
     model_path = os.path.join(OUTPUT_DIR, 'risk_prediction_model.h5')
     preprocessor_path = os.path.join(OUTPUT_DIR, 'preprocessor.pkl')
@@ -56,6 +161,9 @@ def train_and_save_all_assets():
     numerical_features_path = os.path.join(OUTPUT_DIR, 'numerical_features.pkl')
     categorical_features_for_preprocessing_path = os.path.join(OUTPUT_DIR, 'categorical_features_for_preprocessing.pkl')
     initial_df_path = os.path.join(OUTPUT_DIR, 'initial_df.pkl') # initial_df'i de kaydet!
+    velocity_tracker_path = os.path.join(OUTPUT_DIR, 'velocity_tracker.pkl')
+    ip_range_index_path = os.path.join(OUTPUT_DIR, 'ip_range_index.pkl')
+    drift_reference_path = os.path.join(OUTPUT_DIR, 'drift_reference.pkl')
 
     # OUTPUT_DIR'ın var olduğundan emin ol
     if not os.path.exists(OUTPUT_DIR):
@@ -78,8 +186,29 @@ def train_and_save_all_assets():
         pickle.dump(categorical_features_for_preprocessing, f)
     with open(initial_df_path, 'wb') as f:
         pickle.dump(df, f) # Eğitilmiş df'i initial_df olarak kaydet
+    with open(velocity_tracker_path, 'wb') as f:
+        pickle.dump(velocity_tracker, f)
+    with open(ip_range_index_path, 'wb') as f:
+        pickle.dump(ip_range_index, f)
+    with open(drift_reference_path, 'wb') as f:
+        pickle.dump(drift_reference, f)
 
     print("Model ve tüm ilgili varlıklar başarıyla kaydedildi.")
 
+    if event_log_dir:
+        archive_event_log(event_log_dir)
+
+    # Parçalı servis için kullanıcıya bağlı varlıkları UserId'ye göre böl
+    if num_shards > 0:
+        partition_assets(df, user_profiles, velocity_tracker, num_shards)
+
 if __name__ == '__main__':
-    train_and_save_all_assets()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Modeli eğitir ve tüm varlıkları kaydeder.")
+    parser.add_argument('--num-shards', type=int, default=NUM_SHARDS,
+                        help="Geçmiş ve profilleri bu sayıda parçaya böl (0: bölme; --from-event-log ile "
+                             "mevcut parça manifest'indeki sayı kullanılır)")
+    parser.add_argument('--from-event-log', nargs='?', const=EVENT_LOG_DIR, default=None, metavar='LOG_DIR',
+                        help="Sahte veri yerine önceki eğitim verisi ve olay günlüğüyle yeniden eğit "
+                             f"(varsayılan klasör: {EVENT_LOG_DIR})")
+    args = parser.parse_args()
+    train_and_save_all_assets(num_shards=args.num_shards, event_log_dir=args.from_event_log)
\ No newline at end of file
@@ -0,0 +1,421 @@
+# monitoring.py
+
+import hashlib
+import math
+import threading
+import time
+
+import numpy as np
+
+from config import DRIFT_NUM_BINS, DRIFT_HALF_LIFE_SECONDS, DRIFT_CMS_DEPTH, DRIFT_CMS_WIDTH, DRIFT_HLL_PRECISION, \
+                   DRIFT_TOP_UNKNOWN_VALUES, DRIFT_PSI_ALERT, DRIFT_UNKNOWN_RATE_ALERT, DRIFT_MIN_EVENTS, \
+                   DRIFT_CYCLE_FEATURES, DRIFT_CYCLE_HALF_LIFE_SECONDS, DRIFT_ALERT_EXEMPT_FEATURES
+
+# Skor serileri (0-1 ölçeğinde); sayısal özelliklerle aynı histogram yapısında izlenir
+SCORE_SERIES = ['predictedRiskScore', 'actualRiskScore', 'absoluteError']
+REPORT_QUANTILES = [0.5, 0.9, 0.99]
+RISKY_SCORE_THRESHOLD = 0.50 # format_result ile aynı eşik
+PSI_EPSILON = 1e-4 # Boş kutularda log(0)'dan kaçınmak için
+MAX_DECAY_WEIGHT = 1e30 # Sönüm ağırlığı bunu aşınca sayaçlar yeniden ölçeklenir
+EDGE_TOLERANCE = 1e-6 # Ölçekten geri çevrilen değerlerin kutu sınırında yanlış kutuya düşmemesi için
+
+
+def _hash64(value):
+    # Süreçler arasında kararlı 64 bitlik özet
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def population_stability_index(reference_proportions, live_counts):
+    live_total = live_counts.sum()
+    if live_total <= 0:
+        return None
+    reference = np.maximum(reference_proportions, PSI_EPSILON)
+    live = np.maximum(live_counts / live_total, PSI_EPSILON)
+    return float(np.sum((live - reference) * np.log(live / reference)))
+
+
+def ks_statistic(reference_proportions, live_counts):
+    # Kutu sınırlarında ölçülen iki birikimli dağılım arasındaki en büyük fark
+    live_total = live_counts.sum()
+    if live_total <= 0:
+        return None
+    return float(np.max(np.abs(np.cumsum(live_counts / live_total) - np.cumsum(reference_proportions))))
+
+
+class CountMinSketch:
+    """
+    Bilinmeyen kategori değerlerinin (ağırlıklı) sıklığını sabit bellekte tahmin eder; tahmin hiçbir zaman eksik değildir.
+    """
+
+    def __init__(self, depth=DRIFT_CMS_DEPTH, width=DRIFT_CMS_WIDTH):
+        self.width = width
+        self.counts = np.zeros((depth, width))
+        self._rows = np.arange(depth)
+
+    def _positions(self, value_hash):
+        # Çift özetleme: satır i için h1 + i * h2
+        first, second = value_hash & 0xFFFFFFFF, (value_hash >> 32) | 1
+        return (first + self._rows * second) % self.width
+
+    def add(self, value_hash, weight=1.0):
+        self.counts[self._rows, self._positions(value_hash)] += weight
+
+    def estimate(self, value_hash):
+        return float(self.counts[self._rows, self._positions(value_hash)].min())
+
+
+class HyperLogLog:
+    """
+    Görülen farklı değer sayısını 2^precision baytlık register dizisiyle tahmin eder.
+    """
+
+    def __init__(self, precision=DRIFT_HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, value_hash):
+        remaining_bits = 64 - self.precision
+        index = value_hash >> remaining_bits
+        rank = remaining_bits - (value_hash & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        num_registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / num_registers)
+        raw_estimate = alpha * num_registers ** 2 / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zero_registers = int(np.count_nonzero(self.registers == 0))
+        if raw_estimate <= 2.5 * num_registers and zero_registers:
+            return num_registers * math.log(num_registers / zero_registers) # Küçük sayılar için doğrusal sayım
+        return float(raw_estimate)
+
+
+class DriftMonitor:
+    """
+    Canlı trafiği eğitimde kaydedilen referansla karşılaştırır.
+    Sayısal özellikler ve skorlar referans kantillerinden çıkarılan sabit kutularla histogramlanır (PSI, KS, kantiller);
+    kategorik özellikler encoder'ın kategorileri üzerinden sayılır, eğitimde görülmemiş değerler count-min sketch ve
+    HyperLogLog ile izlenir. Tüm sayaçlar sabit boyutludur ve yarı ömürle sönümlenir. Gün/hafta döngülü özellikler
+    (DRIFT_CYCLE_FEATURES) için döngüyü kapsayan, daha uzun yarı ömürlü ikinci bir histogram tutulur.
+    Güncellemeler preprocessor çıktısından okunur: sayısal değerler ölçekten geri çevrilir, one-hot bloğu tamamen
+    sıfır olan kategori eğitimde görülmemiştir. Sönüm, sayaçları her olayda çarpmak yerine yeni olayların
+    ağırlığını zamanla büyüterek uygulanır.
+    """
+
+    def __init__(self, half_life_seconds=DRIFT_HALF_LIFE_SECONDS, top_unknown_values=DRIFT_TOP_UNKNOWN_VALUES,
+                 cycle_half_life_seconds=DRIFT_CYCLE_HALF_LIFE_SECONDS):
+        self.half_life_seconds = half_life_seconds
+        self.cycle_half_life_seconds = cycle_half_life_seconds
+        self.top_unknown_values = top_unknown_values
+        self.numerical_features = []
+        self.categorical_features = []
+        self.total_events = 0
+        self._series_names = []
+        self._edges = np.zeros((0, 0))
+        self._num_bins = np.zeros(0, dtype=np.int64)
+        self._reference = np.zeros((0, 1))
+        self._reference_quantiles = np.zeros((0, len(REPORT_QUANTILES)))
+        self._bounds = np.zeros((0, 2))
+        self._reference_errors = {}
+        self._numerical_mean = np.zeros(0)
+        self._numerical_scale = np.ones(0)
+        self._category_offsets = np.zeros(1, dtype=np.int64)
+        self._column_features = np.zeros(0, dtype=np.int64) # One-hot sütunu → kategorik özellik numarası
+        self._category_reference = np.zeros(0)
+        self._reset_live_state()
+        self._lock = threading.Lock()
+
+    def _reset_live_state(self):
+        self._counts = np.zeros_like(self._reference)
+        self._live_bounds = np.column_stack([np.full(len(self._series_names), np.inf),
+                                             np.full(len(self._series_names), -np.inf)])
+        self._error_sums = np.zeros(3) # İşaretli hata, mutlak hata, risk etiketi uyumu
+        self._weight_sum = 0.0
+        self._decay_origin = None
+        self._category_counts = np.zeros_like(self._category_reference)
+        self._unknown_counts = np.zeros(len(self.categorical_features))
+        self._unknown_sketches = [CountMinSketch() for _ in self.categorical_features]
+        self._unknown_distinct = [HyperLogLog() for _ in self.categorical_features]
+        self._top_unknown = [{} for _ in self.categorical_features]
+        self._reset_cycle_state()
+
+    def _reset_cycle_state(self):
+        self._cycle_series = np.array([series for series, name in enumerate(self._series_names)
+                                       if name in DRIFT_CYCLE_FEATURES], dtype=np.int64)
+        self._cycle_counts = np.zeros((len(self._cycle_series), self._reference.shape[1]))
+        self._cycle_weight_sum = 0.0
+        self._cycle_decay_origin = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock'] # Kilit pickle edilemez
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        if '_cycle_counts' not in state: # Döngü histogramından önce kaydedilmiş referans
+            self.cycle_half_life_seconds = DRIFT_CYCLE_HALF_LIFE_SECONDS
+            self._reset_cycle_state()
+
+    # --- Eğitimde referans oluşturma ---
+
+    @classmethod
+    def from_training(cls, df, numerical_features, categorical_features, preprocessor, actual_scores, predicted_scores,
+                      num_bins=DRIFT_NUM_BINS, **kwargs):
+        """
+        Referans anlık görüntüsünü oluşturur. Özellik dağılımları preprocessor'ın fit edildiği df'ten,
+        skor ve hata dağılımları test setindeki gerçek/tahmin skorlarından alınır.
+        """
+        monitor = cls(**kwargs)
+        actual_scores = np.asarray(actual_scores, dtype=float).ravel()
+        predicted_scores = np.asarray(predicted_scores, dtype=float).ravel()
+        series_values = [df[feature].to_numpy(dtype=float) for feature in numerical_features] + \
+                        [predicted_scores, actual_scores, np.abs(predicted_scores - actual_scores)]
+
+        # Kesikli özelliklerde aynı kantiller birleşir, kutu sayısı seriden seriye değişebilir
+        series_edges = [np.unique(np.quantile(values, np.linspace(0, 1, num_bins + 1)[1:-1])) for values in series_values]
+        series_edges = [edges - EDGE_TOLERANCE * np.maximum(1.0, np.abs(edges)) for edges in series_edges]
+        max_edges = max(len(edges) for edges in series_edges)
+        monitor.numerical_features = list(numerical_features)
+        monitor._series_names = list(numerical_features) + SCORE_SERIES
+        monitor._edges = np.full((len(series_edges), max_edges), np.inf)
+        monitor._num_bins = np.array([len(edges) + 1 for edges in series_edges])
+        monitor._reference = np.zeros((len(series_edges), max_edges + 1))
+        for series, (values, edges) in enumerate(zip(series_values, series_edges)):
+            monitor._edges[series, :len(edges)] = edges
+            monitor._reference[series, :len(edges) + 1] = np.bincount(
+                np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1
+            ) / len(values)
+        monitor._reference_quantiles = np.array([np.quantile(values, REPORT_QUANTILES) for values in series_values])
+        monitor._bounds = np.array([[values.min(), values.max()] for values in series_values])
+
+        is_predicted_risky = predicted_scores > RISKY_SCORE_THRESHOLD
+        monitor._reference_errors = {
+            'meanError': float(np.mean(predicted_scores - actual_scores)),
+            'meanAbsoluteError': float(np.mean(np.abs(predicted_scores - actual_scores))),
+            'riskLabelAgreement': float(np.mean(is_predicted_risky == (actual_scores > RISKY_SCORE_THRESHOLD)))
+        }
+
+        scaler = preprocessor.named_transformers_['num']
+        monitor._numerical_mean = scaler.mean_.copy()
+        monitor._numerical_scale = scaler.scale_.copy()
+
+        # One-hot sütunlarının düzeni encoder'ın kategorilerinden alınır (ColumnTransformer'da sayısal bloktan sonra)
+        categories = preprocessor.named_transformers_['cat'].categories_
+        monitor.categorical_features = list(categorical_features)
+        monitor._category_offsets = np.concatenate([[0], np.cumsum([len(values) for values in categories])])
+        monitor._column_features = np.repeat(np.arange(len(categories)), [len(values) for values in categories])
+        monitor._category_reference = np.zeros(monitor._category_offsets[-1])
+        for feature_number, (feature, values) in enumerate(zip(categorical_features, categories)):
+            counts = df[feature].map({value: i for i, value in enumerate(values)}).value_counts()
+            monitor._category_reference[monitor._category_offsets[feature_number] + counts.index.to_numpy(dtype=np.int64)] = \
+                counts.to_numpy() / len(df)
+
+        monitor._reset_live_state()
+        return monitor
+
+    # --- İstek başına güncelleme ---
+
+    def _current_weight(self, now):
+        return 2.0 ** ((now - self._decay_origin) / self.half_life_seconds) if self._decay_origin is not None else 1.0
+
+    def _event_weight(self, now):
+        if self._decay_origin is None:
+            self._decay_origin = now
+        weight = self._current_weight(now)
+        if weight > MAX_DECAY_WEIGHT:
+            # Oranlar ortak çarpandan etkilenmez; taşmayı önlemek için tüm sayaçlar küçültülür
+            scale = 1.0 / weight
+            self._counts *= scale
+            self._error_sums *= scale
+            self._weight_sum *= scale
+            self._category_counts *= scale
+            self._unknown_counts *= scale
+            for sketch, top_unknown in zip(self._unknown_sketches, self._top_unknown):
+                sketch.counts *= scale
+                for value in top_unknown:
+                    top_unknown[value] *= scale
+            self._decay_origin = now
+            weight = 1.0
+        return weight
+
+    def _cycle_current_weight(self, now):
+        if self._cycle_decay_origin is None:
+            return 1.0
+        return 2.0 ** ((now - self._cycle_decay_origin) / self.cycle_half_life_seconds)
+
+    def _cycle_event_weight(self, now):
+        if self._cycle_decay_origin is None:
+            self._cycle_decay_origin = now
+        weight = self._cycle_current_weight(now)
+        if weight > MAX_DECAY_WEIGHT:
+            self._cycle_counts /= weight
+            self._cycle_weight_sum /= weight
+            self._cycle_decay_origin = now
+            weight = 1.0
+        return weight
+
+    def update(self, entry_df, processed_data, predicted_scores, now=None):
+        """
+        Skorlanmış girişleri sketch'lere ekler. entry_df prepare_entries çıktısı, processed_data aynı satırların
+        preprocessor çıktısı, predicted_scores 0-1 ölçeğindeki tahminlerdir.
+        DataFrame'e yalnızca kural skoru ve (nadir) bilinmeyen kategori değerleri için erişilir.
+        """
+        now = time.time() if now is None else now
+        num_numerical = len(self.numerical_features)
+        predicted_scores = np.asarray(predicted_scores, dtype=float).ravel()
+        actual_scores = entry_df['RiskScore'].to_numpy(dtype=float)
+        values = np.column_stack([processed_data[:, :num_numerical] * self._numerical_scale + self._numerical_mean,
+                                  predicted_scores, actual_scores, np.abs(predicted_scores - actual_scores)])
+        # Tüm seriler için kutu indeksleri tek işlemde (doldurma kenarları +inf olduğu için sayılmaz)
+        bins = (values[:, :, None] >= self._edges[None]).sum(axis=2)
+
+        hit_rows, hit_columns = np.nonzero(processed_data[:, num_numerical:])
+        is_known = np.zeros((len(values), len(self.categorical_features)), dtype=bool)
+        is_known[hit_rows, self._column_features[hit_columns]] = True
+        unknown_rows, unknown_features = np.nonzero(~is_known)
+
+        with self._lock:
+            weight = self._event_weight(now)
+            np.add.at(self._counts, (np.broadcast_to(np.arange(len(self._series_names)), bins.shape), bins), weight)
+            self._live_bounds[:, 0] = np.minimum(self._live_bounds[:, 0], values.min(axis=0))
+            self._live_bounds[:, 1] = np.maximum(self._live_bounds[:, 1], values.max(axis=0))
+            self._error_sums += weight * np.array([
+                np.sum(predicted_scores - actual_scores),
+                np.sum(np.abs(predicted_scores - actual_scores)),
+                np.sum((predicted_scores > RISKY_SCORE_THRESHOLD) == (actual_scores > RISKY_SCORE_THRESHOLD))
+            ])
+            self._weight_sum += weight * len(values)
+            self.total_events += len(values)
+
+            if len(self._cycle_series):
+                cycle_weight = self._cycle_event_weight(now)
+                cycle_bins = bins[:, self._cycle_series]
+                np.add.at(self._cycle_counts, (np.broadcast_to(np.arange(len(self._cycle_series)), cycle_bins.shape),
+                                               cycle_bins), cycle_weight)
+                self._cycle_weight_sum += cycle_weight * len(values)
+
+            np.add.at(self._category_counts, hit_columns, weight)
+            np.add.at(self._unknown_counts, unknown_features, weight)
+            for row, feature_number in zip(unknown_rows, unknown_features):
+                value = entry_df[self.categorical_features[feature_number]].iat[row]
+                self._add_unknown(feature_number, value, weight)
+
+    def _add_unknown(self, feature_number, value, weight):
+        value_hash = _hash64(value)
+        sketch = self._unknown_sketches[feature_number]
+        sketch.add(value_hash, weight)
+        self._unknown_distinct[feature_number].add(value_hash)
+
+        # En sık bilinmeyen değer adayları (sabit boyutlu); yer yoksa en düşük tahminli aday değiştirilir
+        top_unknown = self._top_unknown[feature_number]
+        estimate = sketch.estimate(value_hash)
+        if value in top_unknown or len(top_unknown) < self.top_unknown_values:
+            top_unknown[value] = estimate
+        else:
+            smallest = min(top_unknown, key=top_unknown.get)
+            if estimate > top_unknown[smallest]:
+                del top_unknown[smallest]
+                top_unknown[value] = estimate
+
+    # --- Rapor ---
+
+    def _live_quantiles(self, series, counts):
+        num_edges = self._num_bins[series] - 1
+        edges = self._edges[series, :num_edges]
+        lower_bound = min(self._bounds[series, 0], self._live_bounds[series, 0])
+        upper_bound = max(self._bounds[series, 1], self._live_bounds[series, 1])
+        cumulative = np.cumsum(counts) / counts.sum()
+        quantiles = []
+        for q in REPORT_QUANTILES:
+            # Kantilin düştüğü kutu içinde doğrusal ara değer
+            bin_index = min(int(np.searchsorted(cumulative, q)), num_edges)
+            bin_low = edges[bin_index - 1] if bin_index > 0 else lower_bound
+            bin_high = edges[bin_index] if bin_index < num_edges else upper_bound
+            previous = cumulative[bin_index - 1] if bin_index > 0 else 0.0
+            share = cumulative[bin_index] - previous
+            fraction = (q - previous) / share if share > 0 else 0.0
+            quantiles.append(bin_low + fraction * (bin_high - bin_low))
+        return quantiles
+
+    def report(self, now=None):
+        """
+        Kayma metriklerini JSON'a uygun sözlük olarak döndürür. alerts, eşikleri aşan seri ve özellikleri listeler.
+        Döngülü özelliklerin alarmı döngüyü kapsayan histogramdan (window: 'cycle') üretilir; DRIFT_ALERT_EXEMPT_FEATURES
+        raporlanır ancak alarm üretmez.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            current_weight = self._current_weight(now)
+            effective_events = self._weight_sum / current_weight
+            can_alert = effective_events >= DRIFT_MIN_EVENTS
+            cycle_effective_events = self._cycle_weight_sum / self._cycle_current_weight(now)
+            cycle_rows = {series: row for row, series in enumerate(self._cycle_series)}
+            report = {
+                'totalEvents': self.total_events,
+                'effectiveEvents': round(effective_events, 2),
+                'halfLifeSeconds': self.half_life_seconds,
+                'alerts': [],
+                'scores': {},
+                'numerical': {},
+                'categorical': {}
+            }
+
+            for series, name in enumerate(self._series_names):
+                num_bins = self._num_bins[series]
+                counts = self._counts[series, :num_bins]
+                reference = self._reference[series, :num_bins]
+                psi = population_stability_index(reference, counts)
+                series_report = {
+                    'psi': None if psi is None else round(psi, 4),
+                    'ks': None if psi is None else round(ks_statistic(reference, counts), 4),
+                    'quantiles': None if psi is None else
+                        {f'p{int(q * 100)}': round(float(v), 4) for q, v in zip(REPORT_QUANTILES, self._live_quantiles(series, counts))},
+                    'referenceQuantiles': {f'p{int(q * 100)}': round(float(v), 4)
+                                           for q, v in zip(REPORT_QUANTILES, self._reference_quantiles[series])}
+                }
+                report['scores' if name in SCORE_SERIES else 'numerical'][name] = series_report
+                if series in cycle_rows:
+                    # Kısa pencere yalnızca raporlanır; alarm döngüyü kapsayan histogramdan
+                    cycle_counts = self._cycle_counts[cycle_rows[series], :num_bins]
+                    cycle_psi = population_stability_index(reference, cycle_counts)
+                    series_report['cycle'] = {
+                        'psi': None if cycle_psi is None else round(cycle_psi, 4),
+                        'effectiveEvents': round(float(cycle_effective_events), 2),
+                        'halfLifeSeconds': self.cycle_half_life_seconds
+                    }
+                    if cycle_effective_events >= DRIFT_MIN_EVENTS and cycle_psi is not None and cycle_psi > DRIFT_PSI_ALERT:
+                        report['alerts'].append({'feature': name, 'metric': 'psi', 'window': 'cycle',
+                                                 'value': round(cycle_psi, 4)})
+                elif name in DRIFT_ALERT_EXEMPT_FEATURES:
+                    series_report['alertExempt'] = True
+                elif can_alert and psi is not None and psi > DRIFT_PSI_ALERT:
+                    report['alerts'].append({'feature': name, 'metric': 'psi', 'value': round(psi, 4)})
+
+            if self._weight_sum > 0:
+                live_errors = self._error_sums / self._weight_sum
+                report['scores']['meanError'] = round(float(live_errors[0]), 4)
+                report['scores']['meanAbsoluteError'] = round(float(live_errors[1]), 4)
+                report['scores']['riskLabelAgreement'] = round(float(live_errors[2]), 4)
+            report['scores']['reference'] = {name: round(value, 4) for name, value in self._reference_errors.items()}
+
+            for feature_number, feature in enumerate(self.categorical_features):
+                start, end = self._category_offsets[feature_number], self._category_offsets[feature_number + 1]
+                counts = np.append(self._category_counts[start:end], self._unknown_counts[feature_number]) # Son kutu: bilinmeyen
+                total = counts.sum()
+                psi = population_stability_index(np.append(self._category_reference[start:end], 0.0), counts)
+                unknown_rate = float(counts[-1] / total) if total > 0 else None
+                top_unknown = sorted(self._top_unknown[feature_number].items(), key=lambda item: -item[1])
+                report['categorical'][feature] = {
+                    'psi': None if psi is None else round(psi, 4),
+                    'unknownRate': None if unknown_rate is None else round(unknown_rate, 4),
+                    'distinctUnknownValues': int(round(self._unknown_distinct[feature_number].estimate())),
+                    'topUnknownValues': [{'value': str(value), 'count': round(estimate / current_weight, 2)}
+                                         for value, estimate in top_unknown]
+                }
+                if can_alert and psi is not None and psi > DRIFT_PSI_ALERT:
+                    report['alerts'].append({'feature': feature, 'metric': 'psi', 'value': round(psi, 4)})
+                if can_alert and unknown_rate is not None and unknown_rate > DRIFT_UNKNOWN_RATE_ALERT:
+                    report['alerts'].append({'feature': feature, 'metric': 'unknownRate', 'value': round(unknown_rate, 4)})
+        return report
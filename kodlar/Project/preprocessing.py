@@ -9,6 +9,8 @@ import pickle
 import os
 
 from config import SEQUENCE_LENGTH, OUTPUT_DIR
+from velocity_features import VELOCITY_FEATURES
+from ip_enrichment import NETWORK_NUMERICAL_FEATURES, NETWORK_CATEGORICAL_FEATURES
 
 def create_preprocessors(df_columns_for_fit, risk_feature_mappings):
     """
@@ -21,10 +23,10 @@ def create_preprocessors(df_columns_for_fit, risk_feature_mappings):
 
     numerical_features = [
         'CreatedAt_Hour', 'CreatedAt_DayOfWeek', 'CreatedAt_Month'
-    ] + [col_name for col_name in risk_feature_mappings.keys()]
+    ] + [col_name for col_name in risk_feature_mappings.keys()] + VELOCITY_FEATURES + NETWORK_NUMERICAL_FEATURES
 
 
-    categorical_features_for_preprocessing = categorical_features + ['ClientIP_Block']
+    categorical_features_for_preprocessing = categorical_features + ['ClientIP_Block'] + NETWORK_CATEGORICAL_FEATURES
 
     preprocessor = ColumnTransformer(
         transformers=[
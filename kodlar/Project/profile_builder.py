@@ -0,0 +1,247 @@
+# profile_builder.py
+
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from config import PROFILE_HALF_LIFE_DAYS, PROFILE_IP_BLOCK_SLOTS, PROFILE_USUAL_IP_MIN_SHARE
+from feature_engineering import ip_block, normalize_created_at, epoch_seconds
+
+# Profil anahtarı → giriş sütunu (en sık görülen değer profil değeri olur)
+PROFILE_FIELDS = {
+    'preferred_mfa': 'MFAMethod',
+    'preferred_app': 'Application',
+    'preferred_browser': 'Browser',
+    'preferred_os': 'OS',
+    'unit': 'Unit',
+    'title': 'Title'
+}
+
+
+class ProfileStore(Mapping):
+    """
+    Kullanıcı profillerini gözlenen geçmişten öğrenir ve olay başına günceller.
+    Her alan için kullanıcı x değer boyutlu, yarı ömürle sönümlenen (decayed) sayaç matrisleri tutulur;
+    profil değeri en yüksek sayaçlı değerdir. IP blokları için kullanıcı başına sabit sayıda yuva kullanılır.
+    Sözlük gibi davrandığı için get_risk_feature'a doğrudan user_profiles olarak verilebilir.
+    """
+
+    def __init__(self, half_life_days=PROFILE_HALF_LIFE_DAYS, ip_block_slots=PROFILE_IP_BLOCK_SLOTS,
+                 usual_ip_min_share=PROFILE_USUAL_IP_MIN_SHARE):
+        self.half_life_seconds = half_life_days * 86400.0
+        self.ip_block_slots = ip_block_slots
+        self.usual_ip_min_share = usual_ip_min_share
+        self._user_index = {}
+        self._num_users = 0
+        self._last_seen = np.zeros(0)
+        self._vocab = {field: {} for field in PROFILE_FIELDS}
+        self._vocab_values = {field: [] for field in PROFILE_FIELDS}
+        self._counts = {field: np.zeros((0, 0), dtype=np.float32) for field in PROFILE_FIELDS}
+        self._hour_counts = np.zeros((0, 24), dtype=np.float32)
+        self._ip_blocks = np.full((0, ip_block_slots), '', dtype=object)
+        self._ip_block_counts = np.zeros((0, ip_block_slots), dtype=np.float32)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock'] # Kilit pickle edilemez
+        state['_cache'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # --- Geçmişten toplu oluşturma ---
+
+    @classmethod
+    def from_history(cls, df, **kwargs):
+        """
+        Profilleri geçmişten tek bir vektörel group-by geçişiyle hesaplar.
+        Her giriş, kullanıcının son girişine göre sönümlenmiş ağırlıkla sayılır; sonuç, aynı girişleri
+        update() ile tek tek işlemekle aynıdır.
+        """
+        store = cls(**kwargs)
+        timestamps = epoch_seconds(df['CreatedAt'])
+        user_codes, user_ids = pd.factorize(df['UserId'])
+        num_users = len(user_ids)
+
+        last_seen = pd.Series(timestamps).groupby(user_codes).max().to_numpy()
+        weights = 0.5 ** ((last_seen[user_codes] - timestamps) / store.half_life_seconds)
+
+        store._user_index = {user_id: row for row, user_id in enumerate(user_ids)}
+        store._num_users = num_users
+        store._last_seen = last_seen.astype(np.float64)
+
+        for field, column in PROFILE_FIELDS.items():
+            value_codes, values = pd.factorize(df[column])
+            # Eksik (NaN) değerler -1 kodu alır; sayılmazlar, aksi halde bir önceki kullanıcının son değerine eklenirler
+            known = value_codes >= 0
+            store._vocab_values[field] = list(values)
+            store._vocab[field] = {value: index for index, value in enumerate(values)}
+            store._counts[field] = np.bincount(
+                user_codes[known] * len(values) + value_codes[known], weights=weights[known],
+                minlength=num_users * len(values)
+            ).reshape(num_users, len(values)).astype(np.float32)
+
+        hours = normalize_created_at(df['CreatedAt']).dt.hour.to_numpy()
+        store._hour_counts = np.bincount(
+            user_codes * 24 + hours, weights=weights, minlength=num_users * 24
+        ).reshape(num_users, 24).astype(np.float32)
+
+        # Kullanıcı başına en ağır ip_block_slots kadar IP bloğu
+        ip_blocks = df['ClientIP_Block'] if 'ClientIP_Block' in df else df['ClientIP'].map(ip_block)
+        block_weights = pd.DataFrame({'user': user_codes, 'block': ip_blocks.to_numpy(), 'weight': weights}) \
+            .groupby(['user', 'block'], sort=False)['weight'].sum().reset_index() \
+            .sort_values(['user', 'weight'], ascending=[True, False])
+        block_weights['slot'] = block_weights.groupby('user').cumcount()
+        block_weights = block_weights[block_weights['slot'] < store.ip_block_slots]
+        store._ip_blocks = np.full((num_users, store.ip_block_slots), '', dtype=object)
+        store._ip_block_counts = np.zeros((num_users, store.ip_block_slots), dtype=np.float32)
+        store._ip_blocks[block_weights['user'].to_numpy(), block_weights['slot'].to_numpy()] = block_weights['block'].to_numpy()
+        store._ip_block_counts[block_weights['user'].to_numpy(), block_weights['slot'].to_numpy()] = block_weights['weight'].to_numpy()
+        return store
+
+    # --- Olay başına güncelleme ---
+
+    def _ensure_user(self, user_id):
+        row = self._user_index.get(user_id)
+        if row is not None:
+            return row
+        row = self._num_users
+        if row >= len(self._last_seen):
+            # Kapasiteyi ikiye katla (yeni kullanıcılar nadir olduğu için amorti O(1))
+            extra_rows = max(len(self._last_seen), 16)
+            self._last_seen = np.concatenate([self._last_seen, np.zeros(extra_rows)])
+            for field in PROFILE_FIELDS:
+                self._counts[field] = np.vstack([self._counts[field],
+                                                 np.zeros((extra_rows, self._counts[field].shape[1]), dtype=np.float32)])
+            self._hour_counts = np.vstack([self._hour_counts, np.zeros((extra_rows, 24), dtype=np.float32)])
+            self._ip_blocks = np.vstack([self._ip_blocks, np.full((extra_rows, self.ip_block_slots), '', dtype=object)])
+            self._ip_block_counts = np.vstack([self._ip_block_counts,
+                                               np.zeros((extra_rows, self.ip_block_slots), dtype=np.float32)])
+        self._user_index[user_id] = row
+        self._num_users += 1
+        return row
+
+    def _value_index(self, field, value):
+        index = self._vocab[field].get(value)
+        if index is None:
+            index = self._vocab[field][value] = len(self._vocab_values[field])
+            self._vocab_values[field].append(value)
+            counts = self._counts[field]
+            if index >= counts.shape[1]:
+                self._counts[field] = np.hstack([counts, np.zeros((counts.shape[0], max(counts.shape[1], 4)), dtype=np.float32)])
+        return index
+
+    def update(self, user_id, created_at, values, client_ip_block):
+        """
+        Tek bir girişi kullanıcının sayaçlarına ekler. values, PROFILE_FIELDS sütun adlarıyla giriş değerleridir.
+        Mevcut sayaçlar son görülme zamanından bu yana geçen süreye göre sönümlenir.
+        """
+        self._update(user_id, epoch_seconds(created_at), normalize_created_at(created_at).hour, values, client_ip_block)
+
+    def _update(self, user_id, timestamp, hour, values, client_ip_block):
+        with self._lock:
+            row = self._ensure_user(user_id)
+            weight = 1.0
+            elapsed = timestamp - self._last_seen[row]
+            if elapsed > 0:
+                decay = np.float32(0.5 ** (elapsed / self.half_life_seconds))
+                for field in PROFILE_FIELDS:
+                    self._counts[field][row] *= decay
+                self._hour_counts[row] *= decay
+                self._ip_block_counts[row] *= decay
+                self._last_seen[row] = timestamp
+            else:
+                # Sıra dışı (daha eski) olay: sayaçlar yerine olayın kendisi sönümlenir
+                weight = 0.5 ** (-elapsed / self.half_life_seconds)
+
+            for field, column in PROFILE_FIELDS.items():
+                if pd.isna(values[column]):
+                    continue # Eksik değer profile katılmaz (from_history ile aynı)
+                value_index = self._value_index(field, values[column]) # Sayaç matrisi büyüyebilir, önce hesaplanır
+                self._counts[field][row, value_index] += weight
+            self._hour_counts[row, hour] += weight
+
+            slots = np.flatnonzero(self._ip_blocks[row] == client_ip_block)
+            if len(slots):
+                self._ip_block_counts[row, slots[0]] += weight
+            else:
+                # Yer kalmadıysa en hafif blok değiştirilir (space-saving: sayacı devralınır)
+                slot = int(np.argmin(self._ip_block_counts[row]))
+                self._ip_blocks[row, slot] = client_ip_block
+                self._ip_block_counts[row, slot] += weight
+            self._cache.pop(user_id, None)
+
+    def update_from_entries(self, entry_df):
+        """
+        Skorlanmış girişleri sırasıyla profillere ekler.
+        """
+        ip_blocks = entry_df['ClientIP_Block'] if 'ClientIP_Block' in entry_df else entry_df['ClientIP'].map(ip_block)
+        columns = list(PROFILE_FIELDS.values())
+        timestamps = epoch_seconds(entry_df['CreatedAt'])
+        hours = normalize_created_at(entry_df['CreatedAt']).dt.hour.to_numpy()
+        value_rows = zip(*(entry_df[column].to_numpy() for column in columns))
+        for user_id, timestamp, hour, row_values, client_ip_block in zip(
+                entry_df['UserId'].to_numpy(), timestamps, hours, value_rows, ip_blocks.to_numpy()):
+            self._update(user_id, timestamp, hour, dict(zip(columns, row_values)), client_ip_block)
+
+    # --- Okuma (sözlük arayüzü) ---
+
+    def _build_profile(self, row):
+        profile = {
+            field: self._vocab_values[field][int(np.argmax(self._counts[field][row, :len(self._vocab_values[field])]))]
+            for field in PROFILE_FIELDS
+        }
+        block_counts = self._ip_block_counts[row]
+        order = np.argsort(-block_counts, kind='stable')
+        total = block_counts.sum()
+        usual_ip_blocks = [
+            self._ip_blocks[row, slot] for slot in order
+            if self._ip_blocks[row, slot] and (slot == order[0] or block_counts[slot] >= self.usual_ip_min_share * total)
+        ]
+        profile['base_ip'] = usual_ip_blocks[0] if usual_ip_blocks else ''
+        profile['usual_ip_blocks'] = usual_ip_blocks
+        profile['avg_entry_hour'] = int(np.argmax(self._hour_counts[row])) # Tipik (en sık) giriş saati
+        return profile
+
+    def __getitem__(self, user_id):
+        with self._lock:
+            profile = self._cache.get(user_id)
+            if profile is None:
+                profile = self._cache[user_id] = self._build_profile(self._user_index[user_id])
+            return profile
+
+    def __contains__(self, user_id):
+        return user_id in self._user_index
+
+    def __iter__(self):
+        return iter(list(self._user_index))
+
+    def __len__(self):
+        return self._num_users
+
+    def to_dict(self):
+        return {user_id: self[user_id] for user_id in self}
+
+    def subset(self, user_ids):
+        """
+        Yalnızca verilen kullanıcıları içeren yeni bir depo döndürür (parçalı servis için).
+        """
+        store = ProfileStore(self.half_life_seconds / 86400.0, self.ip_block_slots, self.usual_ip_min_share)
+        kept_user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id in self._user_index]
+        rows = [self._user_index[user_id] for user_id in kept_user_ids]
+        store._user_index = {user_id: i for i, user_id in enumerate(kept_user_ids)}
+        store._num_users = len(rows)
+        store._last_seen = self._last_seen[rows].copy()
+        store._vocab = {field: dict(vocab) for field, vocab in self._vocab.items()}
+        store._vocab_values = {field: list(values) for field, values in self._vocab_values.items()}
+        store._counts = {field: counts[rows].copy() for field, counts in self._counts.items()}
+        store._hour_counts = self._hour_counts[rows].copy()
+        store._ip_blocks = self._ip_blocks[rows].copy()
+        store._ip_block_counts = self._ip_block_counts[rows].copy()
+        return store
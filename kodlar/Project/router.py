@@ -0,0 +1,136 @@
+# router.py
+
+import json
+import os
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, request, jsonify
+
+from config import SHARD_REQUEST_TIMEOUT_SECONDS, ROUTER_CONCURRENT_REQUESTS
+from sharding import load_shard_ring
+
+app = Flask(__name__)
+
+# Tutarlı özetleme halkası, main.py --num-shards'ın yazdığı manifest'ten kurulur
+ring = load_shard_ring()
+
+# Parça numarası sırasıyla çalışan adresleri, ör. SHARD_ENDPOINTS="http://127.0.0.1:5001,http://127.0.0.1:5002"
+shard_endpoints = [url.strip().rstrip('/') for url in os.environ.get('SHARD_ENDPOINTS', '').split(',') if url.strip()]
+if len(shard_endpoints) != ring.num_shards:
+    raise ValueError(
+        f"HATA: SHARD_ENDPOINTS {len(shard_endpoints)} adres içeriyor, ancak manifest'te {ring.num_shards} parça var."
+    )
+
+# Havuz tüm istemci istekleri arasında paylaşılır; her istek parça başına bir iş parçacığı kullandığından
+# eşzamanlı istekler birbirinin arkasında sıraya girmesin diye istek sayısı kadar katı ayrılır
+executor = ThreadPoolExecutor(max_workers=max(ring.num_shards, 1) * ROUTER_CONCURRENT_REQUESTS)
+
+
+def _decode_shard_body(raw_body, status):
+    # Parça önündeki proxy/sunucu HTML, boş bir 5xx veya nesne olmayan bir JSON döndürebilir; bu durumda 502 verilir
+    try:
+        body = json.loads(raw_body)
+    except ValueError: # json.JSONDecodeError ve UnicodeDecodeError
+        return {"error": f"Parça HTTP {status} ile JSON olmayan bir yanıt döndürdü."}, 502
+    if not isinstance(body, dict):
+        return {"error": f"Parça HTTP {status} ile JSON nesnesi olmayan bir yanıt döndürdü."}, 502
+    return body, status
+
+
+def forward_json(shard_id, path, payload=None):
+    """
+    JSON isteğini parçaya iletir ve (gövde, durum kodu) döndürür. payload yoksa GET isteği yapılır.
+    """
+    forward_request = urllib.request.Request(
+        shard_endpoints[shard_id] + path,
+        data=None if payload is None else json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='GET' if payload is None else 'POST'
+    )
+    try:
+        with urllib.request.urlopen(forward_request, timeout=SHARD_REQUEST_TIMEOUT_SECONDS) as response:
+            return _decode_shard_body(response.read(), response.status)
+    except urllib.error.HTTPError as e:
+        # Parçanın kendi hata yanıtını (400 vb.) olduğu gibi geri döndür
+        return _decode_shard_body(e.read(), e.code)
+
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    """Girişi UserId'nin sahibi olan parçaya iletir."""
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    if not isinstance(data, dict) or 'UserId' not in data:
+        return jsonify({"error": "Eksik veri: UserId"}), 400
+
+    try:
+        body, status = forward_json(ring.shard_for_user(data['UserId']), '/predict', data)
+        return jsonify(body), status
+    except (urllib.error.URLError, TimeoutError) as e:
+        app.logger.error(f"Parçaya iletim sırasında hata oluştu: {e}", exc_info=True)
+        return jsonify({"error": f"Parçaya ulaşılamadı: {e}"}), 502
+
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """Girişleri sahip parçalara göre gruplar, parçalara paralel iletir ve sonuçları giriş sırasıyla birleştirir."""
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    entries = data.get('entries') if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        return jsonify({"error": "'entries' bir JSON nesneleri listesi olmalıdır."}), 400
+
+    results = [None] * len(entries)
+    positions_by_shard = {}
+    for position, entry in enumerate(entries):
+        if 'UserId' not in entry:
+            results[position] = {"error": "Eksik veri: UserId"}
+            continue
+        positions_by_shard.setdefault(ring.shard_for_user(entry['UserId']), []).append(position)
+
+    futures = {
+        shard_id: executor.submit(forward_json, shard_id, '/predict_batch',
+                                  {"entries": [entries[position] for position in positions]})
+        for shard_id, positions in positions_by_shard.items()
+    }
+    for shard_id, future in futures.items():
+        positions = positions_by_shard[shard_id]
+        try:
+            body, status = future.result()
+            shard_results = body.get('results') if status == 200 else None
+            if status == 200 and (not isinstance(shard_results, list) or len(shard_results) != len(positions)):
+                body = {"error": f"Parça {shard_id} beklenen sayıda sonuç döndürmedi."}
+                shard_results = None
+            if shard_results is None:
+                shard_results = [{"error": body.get('error', f"Parça {shard_id} HTTP {status} döndürdü.")}] * len(positions)
+        except (urllib.error.URLError, TimeoutError) as e:
+            app.logger.error(f"Parça {shard_id}'e iletim sırasında hata oluştu: {e}", exc_info=True)
+            shard_results = [{"error": f"Parçaya ulaşılamadı: {e}"}] * len(positions)
+        for position, result in zip(positions, shard_results):
+            results[position] = result
+
+    return jsonify({"results": results})
+
+
+@app.route('/metrics/drift', methods=['GET'])
+def drift_metrics():
+    """Her parçanın kayma raporunu toplar; parçalar farklı kullanıcıları gördüğü için raporlar ayrı döner."""
+    futures = {shard_id: executor.submit(forward_json, shard_id, '/metrics/drift') for shard_id in range(ring.num_shards)}
+    shards = {}
+    for shard_id, future in futures.items():
+        try:
+            body, status = future.result()
+            shards[str(shard_id)] = body if status == 200 else {"error": f"Parça {shard_id} HTTP {status} döndürdü."}
+        except (urllib.error.URLError, TimeoutError) as e:
+            shards[str(shard_id)] = {"error": f"Parçaya ulaşılamadı: {e}"}
+    return jsonify({"shards": shards})
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
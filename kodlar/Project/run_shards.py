@@ -0,0 +1,52 @@
+# run_shards.py
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from sharding import load_shard_ring
+
+
+def main():
+    """
+    Parçalı modu yerel olarak dener: her parça için bir app.py çalışanı ve önlerinde router.py başlatır.
+    Ctrl+C ile tüm süreçler durdurulur.
+    """
+    parser = argparse.ArgumentParser(description="Parça çalışanlarını ve yönlendiriciyi yerel süreçler olarak başlatır.")
+    parser.add_argument('--base-port', type=int, default=5001, help="İlk parçanın portu; sonrakiler birer artar")
+    parser.add_argument('--router-port', type=int, default=5000)
+    args = parser.parse_args()
+
+    ring = load_shard_ring()
+    processes = []
+    shard_endpoints = []
+    try:
+        for shard_id in range(ring.num_shards):
+            port = args.base_port + shard_id
+            shard_endpoints.append(f'http://127.0.0.1:{port}')
+            env = dict(os.environ, SHARD_ID=str(shard_id), PORT=str(port), FLASK_DEBUG='0')
+            processes.append(subprocess.Popen([sys.executable, 'app.py'], env=env))
+            print(f"Parça {shard_id} çalışanı başlatıldı (port {port}).")
+
+        env = dict(os.environ, SHARD_ENDPOINTS=','.join(shard_endpoints), PORT=str(args.router_port))
+        processes.append(subprocess.Popen([sys.executable, 'router.py'], env=env))
+        print(f"Yönlendirici başlatıldı (port {args.router_port}).")
+
+        # Süreçlerden biri beklenmedik şekilde kapanırsa hepsini durdur
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+        print("Bir süreç sonlandı, diğerleri durduruluyor...")
+    except KeyboardInterrupt:
+        print("Durduruluyor...")
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+# scoring.py
+
+import os
+import pickle
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from config import SEQUENCE_LENGTH, OUTPUT_DIR, RISK_WEIGHTS, SHARDS_DIR, PROFILE_UPDATE_MAX_RISK_SCORE
+from feature_engineering import add_time_and_ip_features, add_risk_features, calculate_risk_scores, normalize_created_at
+from velocity_features import add_velocity_features
+from ip_enrichment import add_network_features
+from sharding import shard_dir
+from event_log import iter_event_log
+
+# Bir giriş olayında bulunması gereken ham alanlar
+REQUIRED_ENTRY_KEYS = ['UserId', 'ClientIP', 'MFAMethod', 'Application', 'Browser', 'OS', 'Unit', 'Title']
+
+# Günlükten geri yüklenirken ham alanlar bu büyüklükte partilerle işlenir
+EVENT_LOG_REPLAY_BATCH_ROWS = 50000
+
+# Kullanıcıya bağlı varlıklar; parçalı modda her çalışan yalnızca kendi parçasınınkileri yükler
+USER_ASSET_NAMES = ['user_profiles', 'initial_df', 'velocity_tracker']
+
+
+def load_assets(output_dir=OUTPUT_DIR, shard_id=None, shards_dir=SHARDS_DIR):
+    """
+    main.py'nin kaydettiği model ve ilgili varlıkları yükler ve bir sözlük olarak döndürür.
+    shard_id verilirse kullanıcıya bağlı varlıklar o parçanın klasöründen yüklenir.
+    """
+    asset_files = {
+        'preprocessor': 'preprocessor.pkl',
+        'target_scaler': 'target_scaler.pkl',
+        'user_profiles': 'user_profiles.pkl',
+        'risk_feature_mappings': 'risk_feature_mappings.pkl',
+        'numerical_features': 'numerical_features.pkl',
+        'categorical_features_for_preprocessing': 'categorical_features_for_preprocessing.pkl',
+        'initial_df': 'initial_df.pkl',
+        'velocity_tracker': 'velocity_tracker.pkl',
+        'ip_range_index': 'ip_range_index.pkl',
+        'drift_monitor': 'drift_reference.pkl'
+    }
+    model_path = os.path.join(output_dir, 'risk_prediction_model.h5')
+
+    asset_paths = {
+        name: os.path.join(shard_dir(shard_id, shards_dir) if shard_id is not None and name in USER_ASSET_NAMES else output_dir,
+                           file_name)
+        for name, file_name in asset_files.items()
+    }
+
+    # Tüm gerekli dosyaların var olduğundan emin ol
+    for path in [model_path] + list(asset_paths.values()):
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"HATA: Gerekli dosya bulunamadı: {path}. "
+                "Lütfen Docker ile model eğitimini (docker run python main.py) tamamladığınızdan emin olun."
+            )
+
+    assets = {'model': tf.keras.models.load_model(model_path)}
+    for name, path in asset_paths.items():
+        with open(path, 'rb') as f:
+            assets[name] = pickle.load(f)
+    return assets
+
+
+def entries_to_dataframe(entries):
+    """
+    Ham giriş olaylarını (sözlük listesi) modelin beklediği DataFrame'e çevirir.
+    CreatedAt verilmemişse şimdiki zaman kullanılır; saat dilimli değerler UTC'ye çevrilir.
+    """
+    rows = []
+    for entry in entries:
+        row = {key: entry[key] for key in REQUIRED_ENTRY_KEYS}
+        row['CreatedAt'] = entry.get('CreatedAt') or datetime.now(timezone.utc)
+        row['IsRisky_Scenario_Gen'] = 0 # Bu alan model eğitimi dışı, sabit bırakılabilir
+        rows.append(row)
+    entry_df = pd.DataFrame(rows)
+    entry_df['CreatedAt'] = normalize_created_at(entry_df['CreatedAt'])
+    return entry_df
+
+
+def prepare_entries(entry_df, assets, update_profiles=True):
+    """
+    Eğitimdeki özellik mühendisliği adımlarını (zaman/IP, ağ, kayan pencere, risk özellikleri, kural skoru) uygular.
+    Kayan pencere izleyicisi her giriş için güncellenir; risk özellikleri profilin girişten önceki haline göre
+    hesaplanır. update_profiles=False ise (toplu skorlama) profiller değiştirilmez.
+    """
+    entry_df = add_time_and_ip_features(entry_df)
+    entry_df = add_network_features(entry_df, assets['ip_range_index'], assets['user_profiles'])
+    entry_df = add_velocity_features(entry_df, assets['velocity_tracker'])
+    entry_df = add_risk_features(entry_df, assets['user_profiles'], assets['risk_feature_mappings'])
+    entry_df['RiskScore'] = calculate_risk_scores(entry_df, RISK_WEIGHTS)
+    if update_profiles:
+        update_profiles_from_entries(entry_df, assets)
+    return entry_df
+
+
+def update_profiles_from_entries(entry_df, assets):
+    """
+    Kural skoru PROFILE_UPDATE_MAX_RISK_SCORE altındaki girişleri profillere ekler. Riskli girişler (ör. yeni blok
+    ve yeni MFA birlikte) eklenmez; aksi halde tek bir saldırı girişi sonrakilerin olağan görünmesine yol açar.
+    """
+    assets['user_profiles'].update_from_entries(entry_df[entry_df['RiskScore'] < PROFILE_UPDATE_MAX_RISK_SCORE])
+
+
+def transform_entries(df, assets):
+    """
+    Satırları preprocessor ile modelin zaman adımı vektörlerine dönüştürür.
+    """
+    features_to_transform = assets['numerical_features'] + assets['categorical_features_for_preprocessing']
+    processed = assets['preprocessor'].transform(df[features_to_transform])
+    return processed.toarray() if hasattr(processed, 'toarray') else np.asarray(processed)
+
+
+class SequenceHistory:
+    """
+    Her kullanıcı için son (SEQUENCE_LENGTH - 1) girişin ön işlenmiş vektörlerini tutar.
+    Kullanıcının geçmişi ilk ihtiyaç duyulduğunda initial_df'ten bir kez dönüştürülür.
+    """
+
+    def __init__(self, assets, initial_df=None):
+        self.assets = assets
+        self.initial_df = initial_df
+        self._user_rows = initial_df.groupby('UserId').indices if initial_df is not None else {}
+        self._recent = {}
+
+    def recent(self, user_id):
+        if user_id not in self._recent:
+            buffer = deque(maxlen=SEQUENCE_LENGTH - 1)
+            row_positions = self._user_rows.get(user_id)
+            if row_positions is not None:
+                user_df = self.initial_df.iloc[row_positions].sort_values(by='CreatedAt').tail(SEQUENCE_LENGTH - 1)
+                buffer.extend(transform_entries(user_df, self.assets))
+            self._recent[user_id] = buffer
+        return self._recent[user_id]
+
+    def append(self, user_id, processed_row):
+        self.recent(user_id).append(processed_row)
+
+
+def score_entries(entry_df, assets, history, update_history=True, event_log=None):
+    """
+    Hazırlanmış girişleri tek bir model.predict çağrısıyla skorlar.
+    Aynı partide aynı kullanıcıya ait birden fazla giriş varsa, sonraki girişin dizisi öncekileri de içerir.
+    Tahminler kayma izleyicisine (drift_monitor) eklenir; event_log verilirse skorlanmış girişler
+    günlüğe yazılır ve diske alınana kadar beklenir.
+    Dönen dizi orijinal ölçekteki (0-1) tahmin skorlarıdır.
+    """
+    processed_data = transform_entries(entry_df, assets)
+    feature_dimension = processed_data.shape[1]
+    sequences = np.zeros((len(entry_df), SEQUENCE_LENGTH, feature_dimension))
+
+    # Parti içi girişlerin geçmişe eklenmesi yalnızca bu çağrı boyunca geçerli olsun diye yerel bir kopya tutulur
+    batch_recent = {}
+    for i, user_id in enumerate(entry_df['UserId']):
+        if user_id not in batch_recent:
+            batch_recent[user_id] = deque(history.recent(user_id), maxlen=SEQUENCE_LENGTH - 1)
+        recent = batch_recent[user_id]
+        actual_sequence_length = len(recent) + 1
+        if recent:
+            sequences[i, SEQUENCE_LENGTH - actual_sequence_length:-1] = np.asarray(recent)
+        sequences[i, -1] = processed_data[i]
+        recent.append(processed_data[i])
+        if update_history:
+            history.append(user_id, processed_data[i])
+
+    predicted_scaled_scores = assets['model'].predict(sequences, verbose=0)
+    predicted_original_scores = assets['target_scaler'].inverse_transform(
+        np.asarray(predicted_scaled_scores).reshape(-1, 1)
+    ).ravel()
+    assets['drift_monitor'].update(entry_df, processed_data, predicted_original_scores)
+
+    if event_log is not None:
+        event_log.append_many(list(zip(
+            entry_raw_fields(entry_df), processed_data, entry_df['RiskScore'], predicted_original_scores
+        )))
+    return predicted_original_scores
+
+
+def entry_raw_fields(entry_df):
+    """
+    Günlüğe yazılacak ham alanları (REQUIRED_ENTRY_KEYS, CreatedAt ve varsa akış kaynağındaki SourceOffset)
+    satır başına sözlük olarak döndürür.
+    """
+    raw_df = entry_df[REQUIRED_ENTRY_KEYS].astype(object).copy()
+    raw_df['CreatedAt'] = entry_df['CreatedAt'].map(lambda created_at: created_at.isoformat())
+    if 'SourceOffset' in entry_df:
+        raw_df['SourceOffset'] = entry_df['SourceOffset'].map(int)
+    return raw_df.to_dict('records')
+
+
+def logged_result(record):
+    """
+    Günlük kaydından, skorlandığı andaki sonucu score_entry_dicts ile aynı biçimde yeniden üretir.
+    """
+    raw = record['raw']
+    result = format_result({'UserId': raw['UserId'], 'RiskScore': record['rule_score']}, record['model_score'])
+    result['createdAt'] = raw['CreatedAt']
+    return result
+
+
+def restore_from_event_log(assets, history, log_dir, on_record=None):
+    """
+    Yeniden başlatmada günlüğü baştan okuyarak kullanıcı başına dizi geçmişini, kayan pencere durumunu
+    ve profilleri son skorlanan girişe kadar yeniden kurar. Geçmiş için günlükteki kodlanmış özellikler
+    doğrudan kullanılır; preprocessor tekrar çalıştırılmaz. on_record verilirse her kayıt için çağrılır
+    (akış skorlayıcı, checkpoint'ten sonra günlüğe yazılmış girişleri bununla bulur).
+    Geri yüklenen kayıt sayısını döndürür.
+    """
+    feature_dimension = len(assets['preprocessor'].get_feature_names_out())
+    restored = 0
+    skipped_features = 0
+    batch = []
+
+    def apply_batch(records):
+        for record in records:
+            if record['features'].shape[0] == feature_dimension:
+                history.append(record['raw']['UserId'], record['features'])
+        replay_df = add_time_and_ip_features(entries_to_dataframe([record['raw'] for record in records]))
+        add_velocity_features(replay_df, assets['velocity_tracker'])
+        replay_df['RiskScore'] = [record['rule_score'] for record in records]
+        update_profiles_from_entries(replay_df, assets)
+
+    for record in iter_event_log(log_dir):
+        if record['features'].shape[0] != feature_dimension:
+            skipped_features += 1
+        if on_record is not None:
+            on_record(record)
+        batch.append(record)
+        if len(batch) >= EVENT_LOG_REPLAY_BATCH_ROWS:
+            apply_batch(batch)
+            restored += len(batch)
+            batch = []
+    if batch:
+        apply_batch(batch)
+        restored += len(batch)
+
+    if skipped_features:
+        print(f"Uyarı: {skipped_features} günlük kaydı farklı bir preprocessor ile kodlandığı için dizi geçmişine eklenmedi.")
+    return restored
+
+
+def validate_entry(entry, assets):
+    """
+    Ham girişi doğrular; sorun varsa hata mesajını, yoksa None döndürür.
+    """
+    missing_keys = [key for key in REQUIRED_ENTRY_KEYS if key not in entry]
+    if missing_keys:
+        return f"Eksik veri: {', '.join(missing_keys)}"
+    invalid_keys = [key for key in REQUIRED_ENTRY_KEYS if not isinstance(entry[key], str) or not entry[key]]
+    if invalid_keys:
+        return f"Geçersiz veri (boş olmayan metin olmalı): {', '.join(invalid_keys)}"
+    created_at = entry.get('CreatedAt')
+    if created_at is not None:
+        if not isinstance(created_at, (str, datetime)):
+            return "Geçersiz CreatedAt: ISO 8601 biçiminde bir metin olmalıdır."
+        try:
+            normalize_created_at(created_at)
+        except (ValueError, TypeError, OverflowError):
+            return f"Geçersiz CreatedAt: '{created_at}' ISO 8601 biçiminde değil."
+    if entry['UserId'] not in assets['user_profiles']:
+        return f"Kullanıcı ID '{entry['UserId']}' için profil bulunamadı."
+    return None
+
+
+def score_entry_dicts(entries, assets, history, update_history=True, event_log=None, source_offsets=None):
+    """
+    Ham giriş sözlüklerini doğrular ve geçerli olanları tek partide skorlar.
+    Sonuçlar giriş sırasını korur; geçersiz girişler için {'error': ...} döner.
+    source_offsets verilirse (girişlerle aynı sırada) her girişin kaynak offset'i günlük kaydına yazılır.
+    DataFrame'e çevirme aşamasına kadar hiçbir durum değişmez; bu aşamadaki hatalar giriş bazında ayıklanır.
+    prepare_entries ile başlayan aşamada (izleyici, profiller, geçmiş, kayma, günlük güncellenir) oluşan
+    hata ise olduğu gibi fırlatılır; parti tekrar skorlanmamalıdır, aksi halde durum iki kez güncellenir.
+    """
+    results = [None] * len(entries)
+    valid_positions = []
+    valid_entries = []
+    for position, entry in enumerate(entries):
+        error = validate_entry(entry, assets)
+        if error:
+            results[position] = {'error': error}
+            continue
+        valid_positions.append(position)
+        valid_entries.append(entry)
+
+    if valid_entries:
+        try:
+            entry_df = entries_to_dataframe(valid_entries)
+        except Exception:
+            # Henüz durum değişmedi: dönüştürülemeyen girişler tek tek bulunup hata sonucu alır
+            convertible = []
+            for position, entry in zip(valid_positions, valid_entries):
+                try:
+                    entries_to_dataframe([entry])
+                    convertible.append((position, entry))
+                except Exception as e:
+                    results[position] = {'error': f"Geçersiz veri: {e}"}
+            valid_positions = [position for position, _ in convertible]
+            valid_entries = [entry for _, entry in convertible]
+            if not valid_entries:
+                return results
+            entry_df = entries_to_dataframe(valid_entries)
+        if source_offsets is not None:
+            entry_df['SourceOffset'] = [source_offsets[position] for position in valid_positions]
+        entry_df = prepare_entries(entry_df, assets)
+        predicted_original_scores = score_entries(entry_df, assets, history, update_history=update_history,
+                                                  event_log=event_log)
+        for i, position in enumerate(valid_positions):
+            entry_row = entry_df.iloc[i]
+            result = format_result(entry_row, predicted_original_scores[i])
+            result['createdAt'] = entry_row['CreatedAt'].isoformat()
+            results[position] = result
+    return results
+
+
+def format_result(entry_row, predicted_original_score):
+    """
+    /predict yanıtıyla aynı biçimde sonuç sözlüğü üretir.
+    """
+    risk_evaluation = "Yüksek Riskli" if predicted_original_score > 0.50 else "Düşük Riskli"
+    return {
+        "userId": entry_row['UserId'],
+        "actualRiskScore": round(float(entry_row['RiskScore']) * 100, 2),
+        "predictedRiskScore": round(float(predicted_original_score) * 100, 2),
+        "isRisky": risk_evaluation
+    }
@@ -0,0 +1,86 @@
+# sharding.py
+
+import bisect
+import hashlib
+import json
+import os
+import pickle
+
+from config import SHARDS_DIR, SHARD_VIRTUAL_NODES
+
+SHARD_MANIFEST_FILE = 'shard_manifest.json'
+
+
+def _hash64(key):
+    # Süreçler arasında kararlı olması için Python'un hash()'i yerine md5 kullanılır
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class ConsistentHashRing:
+    """
+    UserId'yi tutarlı özetleme (consistent hashing) ile bir parçaya (shard) eşler.
+    Her parça halkada virtual_nodes kadar noktayla temsil edilir; parça sayısı değiştiğinde
+    kullanıcıların yalnızca küçük bir kısmı yer değiştirir.
+    """
+
+    def __init__(self, num_shards, virtual_nodes=SHARD_VIRTUAL_NODES):
+        self.num_shards = num_shards
+        self.virtual_nodes = virtual_nodes
+        points = sorted(
+            (_hash64(f"shard-{shard_id}#{v}"), shard_id)
+            for shard_id in range(num_shards) for v in range(virtual_nodes)
+        )
+        self._hashes = [point_hash for point_hash, _ in points]
+        self._shards = [shard_id for _, shard_id in points]
+
+    def shard_for_user(self, user_id):
+        index = bisect.bisect(self._hashes, _hash64(str(user_id))) % len(self._hashes)
+        return self._shards[index]
+
+
+def shard_dir(shard_id, shards_dir=SHARDS_DIR):
+    return os.path.join(shards_dir, f'shard_{shard_id}')
+
+
+def load_shard_ring(shards_dir=SHARDS_DIR):
+    """
+    Bölümleme adımının yazdığı manifest'ten aynı halkayı yeniden kurar.
+    """
+    manifest_path = os.path.join(shards_dir, SHARD_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(
+            f"HATA: Parça manifest'i bulunamadı: {manifest_path}. "
+            "Lütfen önce 'python main.py --num-shards N' ile bölümlemeyi çalıştırın."
+        )
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return ConsistentHashRing(manifest['num_shards'], manifest['virtual_nodes'])
+
+
+def partition_assets(df, user_profiles, velocity_tracker, num_shards, shards_dir=SHARDS_DIR):
+    """
+    Kullanıcıya bağlı varlıkları (geçmiş, profiller, kayan pencere durumu) UserId'ye göre parçalara böler
+    ve her parçayı kendi klasörüne yazar. Model ve preprocessor gibi ortak varlıklar OUTPUT_DIR'da kalır.
+    """
+    print(f"\n--- Varlıklar {num_shards} parçaya bölünüyor ---")
+    ring = ConsistentHashRing(num_shards)
+    user_shards = {user_id: ring.shard_for_user(user_id) for user_id in df['UserId'].unique()}
+    for user_id in user_profiles:
+        user_shards.setdefault(user_id, ring.shard_for_user(user_id))
+    row_shards = df['UserId'].map(user_shards)
+
+    for shard_id in range(num_shards):
+        shard_user_ids = [user_id for user_id, owner in user_shards.items() if owner == shard_id]
+        shard_path = shard_dir(shard_id, shards_dir)
+        os.makedirs(shard_path, exist_ok=True)
+
+        with open(os.path.join(shard_path, 'initial_df.pkl'), 'wb') as f:
+            pickle.dump(df[row_shards == shard_id].reset_index(drop=True), f)
+        with open(os.path.join(shard_path, 'user_profiles.pkl'), 'wb') as f:
+            pickle.dump(user_profiles.subset(shard_user_ids), f)
+        with open(os.path.join(shard_path, 'velocity_tracker.pkl'), 'wb') as f:
+            pickle.dump(velocity_tracker.subset(shard_user_ids), f)
+        print(f"Parça {shard_id}: {len(shard_user_ids)} kullanıcı, {(row_shards == shard_id).sum()} giriş kaydı.")
+
+    with open(os.path.join(shards_dir, SHARD_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'num_shards': num_shards, 'virtual_nodes': ring.virtual_nodes}, f)
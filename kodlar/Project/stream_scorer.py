@@ -0,0 +1,430 @@
+# stream_scorer.py
+
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from config import OUTPUT_DIR, STREAM_QUEUE_MAXSIZE, STREAM_MIN_BATCH_SIZE, STREAM_MAX_BATCH_SIZE, \
+                   STREAM_MAX_BATCH_WAIT_SECONDS, STREAM_CHECKPOINT_INTERVAL_SECONDS, STREAM_METRICS_INTERVAL_SECONDS
+from scoring import load_assets, score_entry_dicts, SequenceHistory, restore_from_event_log, logged_result
+from event_log import EventLog
+
+
+def log(message):
+    # stdout sink olarak kullanılabildiği için durum mesajları stderr'e yazılır
+    print(message, file=sys.stderr, flush=True)
+
+
+def put_with_backpressure(out_queue, item, stop_event):
+    """
+    Kuyruk doluysa yer açılana kadar bekler (backpressure). Durdurma istenirse False döner.
+    """
+    while not stop_event.is_set():
+        try:
+            out_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+# --- Kaynaklar (Sources) ---
+# Her kaynak kuyruğa (offset, satır, alınma zamanı) üçlüleri koyar. Offset, checkpoint'e yazılan ve
+# yeniden başlatmada kaldığı yerden devam etmek için kullanılan değerdir.
+
+class JsonlFileSource:
+    """
+    JSONL dosyasını takip eder (tail -f). Offset, okunan son tam satırın sonundaki bayt konumudur.
+    """
+
+    def __init__(self, path, follow=True, poll_interval=0.5):
+        self.path = path
+        self.follow = follow
+        self.poll_interval = poll_interval
+
+    def run(self, out_queue, stop_event, start_offset=0):
+        while not os.path.exists(self.path) and not stop_event.is_set():
+            time.sleep(self.poll_interval)
+
+        with open(self.path, 'rb') as f:
+            f.seek(start_offset)
+            while not stop_event.is_set():
+                line_start = f.tell()
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    # Yarım satır veya dosya sonu: satırın tamamlanmasını bekle
+                    f.seek(line_start)
+                    if not self.follow:
+                        break
+                    if os.path.getsize(self.path) < line_start:
+                        log(f"Uyarı: {self.path} kısaldı (rotate/truncate), baştan okunuyor.")
+                        f.seek(0)
+                    time.sleep(self.poll_interval)
+                    continue
+                if not put_with_backpressure(out_queue, (f.tell(), line.decode('utf-8'), time.time()), stop_event):
+                    break
+
+
+class StdinSource:
+    """
+    Standart girdiden satır okur. Offset satır numarasıdır; aynı girdi yeniden verildiğinde
+    checkpoint'teki satır sayısı kadar satır atlanır.
+    """
+
+    def run(self, out_queue, stop_event, start_offset=0):
+        line_number = 0
+        for line in sys.stdin:
+            line_number += 1
+            if line_number <= start_offset:
+                continue
+            if not put_with_backpressure(out_queue, (line_number, line, time.time()), stop_event):
+                break
+
+
+class SocketSource:
+    """
+    Yerel bir TCP soketinden satır satır JSON okur (mesaj kuyruğu/broker yerine geçer).
+    Kuyruk dolduğunda okuma durur ve TCP akış kontrolü üreticiyi yavaşlatır.
+    Offset, bu süreç boyunca alınan mesajların sıra numarasıdır; soket tekrar oynatılamadığı için
+    yeniden başlatmada yalnızca bilgi amaçlıdır.
+    """
+
+    def __init__(self, host='127.0.0.1', port=9099):
+        self.host = host
+        self.port = port
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _handle_connection(self, connection, out_queue, stop_event):
+        with connection, connection.makefile('r', encoding='utf-8') as reader:
+            for line in reader:
+                # Sıra numarası ile kuyruğa koyma birlikte yapılır ki offset'ler kuyruk sırasıyla aynı olsun
+                with self._lock:
+                    self._sequence += 1
+                    if not put_with_backpressure(out_queue, (self._sequence, line, time.time()), stop_event):
+                        return
+
+    def run(self, out_queue, stop_event, start_offset=0):
+        self._sequence = start_offset
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((self.host, self.port))
+            server.listen()
+            server.settimeout(0.5)
+            log(f"Soket kaynağı {self.host}:{self.port} adresinde dinliyor...")
+            while not stop_event.is_set():
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    continue
+                threading.Thread(target=self._handle_connection, args=(connection, out_queue, stop_event),
+                                 daemon=True).start()
+
+
+# --- Çıkış (Sink) ---
+
+class JsonlSink:
+    """
+    Sonuçları JSONL olarak yazar ('-' stdout demektir). Her parti yazıldıktan sonra diske alınır,
+    böylece checkpoint yalnızca kalıcı olarak yazılmış sonuçlar için ilerler.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = sys.stdout if path == '-' else open(path, 'a', encoding='utf-8')
+
+    def write_batch(self, results):
+        self._file.write(''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in results))
+        self._file.flush()
+        if self._file is not sys.stdout:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+# --- Checkpoint ve Metrikler ---
+
+class OffsetCheckpoint:
+    """
+    İşlenmiş son offset'i atomik olarak (geçici dosya + os.replace) kaydeder.
+    Sonuçlar sink'e yazıldıktan sonra kaydedildiği için en-az-bir-kez (at-least-once) teslimat sağlanır.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('offset', 0)
+
+    def save(self, offset):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'offset': offset, 'updatedAt': time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class StreamMetrics:
+    """
+    Verim (olay/sn), gecikme (kuyrukta bekleme ve olay zamanına göre) ve kuyruk derinliği metriklerini tutar.
+    drift_monitor verilirse kayma alarmları metriklere, tam kayma raporu metrik dosyasına eklenir.
+    """
+
+    def __init__(self, metrics_path=None, drift_monitor=None):
+        self.metrics_path = metrics_path
+        self.drift_monitor = drift_monitor
+        self.started_at = time.time()
+        self.total_events = 0
+        self.total_errors = 0
+        self.total_batches = 0
+        self._interval_started_at = self.started_at
+        self._interval_events = 0
+        self.last_queue_lag_seconds = 0.0
+        self.last_event_lag_seconds = None
+        self.last_batch_size = 0
+        self.queue_depth = 0
+
+    def record_batch(self, batch_size, error_count, oldest_ingest_time, newest_event_time, queue_depth):
+        now = time.time()
+        self.total_events += batch_size
+        self.total_errors += error_count
+        self.total_batches += 1
+        self._interval_events += batch_size
+        self.last_batch_size = batch_size
+        self.queue_depth = queue_depth
+        self.last_queue_lag_seconds = now - oldest_ingest_time
+        if newest_event_time is not None:
+            self.last_event_lag_seconds = now - newest_event_time
+
+    def snapshot(self):
+        now = time.time()
+        interval = max(now - self._interval_started_at, 1e-9)
+        return {
+            'totalEvents': self.total_events,
+            'totalErrors': self.total_errors,
+            'totalBatches': self.total_batches,
+            'eventsPerSecond': round(self._interval_events / interval, 2),
+            'avgEventsPerSecond': round(self.total_events / max(now - self.started_at, 1e-9), 2),
+            'queueLagSeconds': round(self.last_queue_lag_seconds, 4),
+            'eventTimeLagSeconds': None if self.last_event_lag_seconds is None else round(self.last_event_lag_seconds, 4),
+            'lastBatchSize': self.last_batch_size,
+            'queueDepth': self.queue_depth
+        }
+
+    def report(self):
+        snapshot = self.snapshot()
+        drift_report = self.drift_monitor.report() if self.drift_monitor is not None else None
+        if drift_report is not None:
+            snapshot['driftAlerts'] = drift_report['alerts']
+        log(f"[metrik] {json.dumps(snapshot)}")
+        if self.metrics_path:
+            with open(self.metrics_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(snapshot, drift=drift_report) if drift_report is not None else snapshot, f)
+        self._interval_started_at = time.time()
+        self._interval_events = 0
+        return snapshot
+
+
+class AdaptiveBatcher:
+    """
+    Kuyruktan mikro-partiler toplar. Kuyruk biriktikçe parti boyutu büyür (daha az model çağrısı),
+    trafik azaldıkça küçülür (daha düşük gecikme).
+    """
+
+    def __init__(self, in_queue, min_size=STREAM_MIN_BATCH_SIZE, max_size=STREAM_MAX_BATCH_SIZE,
+                 max_wait_seconds=STREAM_MAX_BATCH_WAIT_SECONDS):
+        self.in_queue = in_queue
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_wait_seconds = max_wait_seconds
+        self.batch_size = min_size
+
+    def next_batch(self):
+        try:
+            batch = [self.in_queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.time() + self.max_wait_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.in_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        # Bir sonraki parti boyutunu kuyruk derinliğine göre ayarla
+        depth = self.in_queue.qsize()
+        if depth >= self.batch_size:
+            self.batch_size = min(self.max_size, self.batch_size * 2)
+        elif depth < self.batch_size // 4:
+            self.batch_size = max(self.min_size, self.batch_size // 2)
+        return batch
+
+
+def score_batch(batch, assets, sequence_history, event_log=None):
+    """
+    Bir mikro-partiyi ayrıştırır ve geçerli girişleri tek model çağrısıyla skorlar.
+    Hatalı satırlar için hata sonucu döndürülür; sonuçlar giriş sırasını korur.
+    """
+    entries = []
+    for _, line, _ in batch:
+        try:
+            entry = json.loads(line)
+            if not isinstance(entry, dict):
+                raise ValueError("Her satır bir JSON nesnesi olmalıdır.")
+            entries.append(entry)
+        except ValueError as e: # json.JSONDecodeError da ValueError'dur
+            entries.append({'_parse_error': str(e)})
+
+    parsed_positions = [position for position, entry in enumerate(entries) if '_parse_error' not in entry]
+    parsed_entries = [entries[position] for position in parsed_positions]
+    parsed_offsets = [batch[position][0] for position in parsed_positions]
+    try:
+        scored = score_entry_dicts(parsed_entries, assets, sequence_history, update_history=True, event_log=event_log,
+                                   source_offsets=parsed_offsets)
+    except Exception as e:
+        # Tek bir parti tüm tüketiciyi durdurmasın (aksi halde yeniden başlatmada aynı parti tekrar çöker).
+        # Hatalı girişler score_entry_dicts içinde, durum değişmeden ayıklanır; buraya gelen hata durum
+        # güncellenmeye başladıktan sonra oluşmuştur. Parti tekrar skorlanmaz (izleyici, profiller, geçmiş ve
+        # günlük iki kez güncellenirdi); tüm girişleri için hata sonucu üretilir.
+        log(f"Parti skorlanamadı ({e}), girişleri hata olarak işaretleniyor.")
+        scored = [{'error': f"Skorlama hatası: {e}"} for _ in parsed_entries]
+
+    results = [{'error': entry['_parse_error']} if '_parse_error' in entry else None for entry in entries]
+    for position, result in zip(parsed_positions, scored):
+        results[position] = result
+    for (offset, _, _), result in zip(batch, results):
+        result['offset'] = offset
+
+    # createdAt UTC'dir (saat dilimi bilgisi atılmış); pd.Timestamp saat dilimsiz değeri UTC kabul eder
+    event_times = [pd.Timestamp(result['createdAt']).timestamp() for result in results if 'createdAt' in result]
+    newest_event_time = max(event_times) if event_times else None
+    error_count = sum(1 for result in results if 'error' in result)
+    return results, error_count, newest_event_time
+
+
+def run_stream(source, sink, checkpoint, metrics, assets, queue_maxsize=STREAM_QUEUE_MAXSIZE, event_log_dir=None):
+    """
+    Kaynak iş parçacığını başlatır ve durdurulana kadar mikro-partiler halinde skorlar.
+    event_log_dir verilirse geçmiş önce bu günlükten geri yüklenir ve skorlanan girişler günlüğe eklenir.
+    """
+    stop_event = threading.Event()
+    events_queue = queue.Queue(maxsize=queue_maxsize)
+    start_offset = checkpoint.load()
+
+    sequence_history = SequenceHistory(assets, assets.get('initial_df'))
+    event_log = None
+    if event_log_dir:
+        # Girişler sink ve checkpoint'ten önce günlüğe yazılır. Çökme sonrası checkpoint'ten sonraki girişler
+        # günlükten zaten geri yüklendiği için kaynaktan tekrar skorlanmaz (aksi halde iki kez sayılırlar);
+        # sonuçları günlükten sink'e yazılır ve kaynak son günlüğe alınan offset'ten devam eder.
+        logged_after_checkpoint = []
+
+        def collect_logged(record):
+            source_offset = record['raw'].get('SourceOffset')
+            if source_offset is not None and source_offset > start_offset:
+                logged_after_checkpoint.append(dict(logged_result(record), offset=source_offset))
+
+        restored = restore_from_event_log(assets, sequence_history, event_log_dir, on_record=collect_logged)
+        log(f"Olay günlüğünden {restored} skorlanmış giriş geri yüklendi.")
+        if logged_after_checkpoint:
+            sink.write_batch(logged_after_checkpoint)
+            start_offset = max(result['offset'] for result in logged_after_checkpoint)
+            checkpoint.save(start_offset)
+            log(f"Checkpoint'ten sonra günlüğe alınmış {len(logged_after_checkpoint)} giriş tekrar skorlanmadan atlandı.")
+        event_log = EventLog(event_log_dir)
+    log(f"Akış skorlayıcı başlıyor (başlangıç offset: {start_offset})...")
+
+    def request_stop(signum, frame):
+        log("Durdurma isteği alındı, kuyruktaki olaylar işleniyor...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    source_thread = threading.Thread(target=source.run, args=(events_queue, stop_event, start_offset), daemon=True)
+    source_thread.start()
+
+    batcher = AdaptiveBatcher(events_queue)
+    committed_offset = start_offset
+    last_checkpoint_at = last_metrics_at = time.time()
+
+    while True:
+        batch = batcher.next_batch()
+        if not batch:
+            # Kaynak bittiyse (ör. --no-follow dosya, kapanan stdin) veya durdurulduysa ve kuyruk boşsa çık
+            if (stop_event.is_set() or not source_thread.is_alive()) and events_queue.empty():
+                break
+            continue
+
+        results, error_count, newest_event_time = score_batch(batch, assets, sequence_history, event_log)
+        sink.write_batch(results)
+        committed_offset = batch[-1][0]
+        metrics.record_batch(len(batch), error_count, batch[0][2], newest_event_time, events_queue.qsize())
+
+        now = time.time()
+        if now - last_checkpoint_at >= STREAM_CHECKPOINT_INTERVAL_SECONDS:
+            checkpoint.save(committed_offset)
+            last_checkpoint_at = now
+        if now - last_metrics_at >= STREAM_METRICS_INTERVAL_SECONDS:
+            metrics.report()
+            last_metrics_at = now
+
+    stop_event.set()
+    checkpoint.save(committed_offset)
+    sink.close()
+    if event_log is not None:
+        event_log.close()
+    metrics.report()
+    log(f"Akış skorlayıcı durdu (son offset: {committed_offset}).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Giriş olaylarını akış halinde mikro-partilerle skorlar.")
+    parser.add_argument('--source', choices=['file', 'stdin', 'socket'], default='stdin')
+    parser.add_argument('--path', help="JSONL kaynak dosyası (--source file için)")
+    parser.add_argument('--no-follow', action='store_true', help="Dosya sonuna gelince beklemeden çık")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9099)
+    parser.add_argument('--sink', default='-', help="Sonuçların yazılacağı JSONL dosyası ('-' stdout)")
+    parser.add_argument('--checkpoint', default=os.path.join(OUTPUT_DIR, 'stream_checkpoint.json'))
+    parser.add_argument('--metrics-path', default=None, help="Metrik özetinin yazılacağı JSON dosyası")
+    parser.add_argument('--queue-size', type=int, default=STREAM_QUEUE_MAXSIZE)
+    parser.add_argument('--shard-id', type=int, default=None, help="Yalnızca bu parçanın kullanıcı varlıklarını yükle")
+    parser.add_argument('--event-log-dir', default=None,
+                        help="Skorlanan girişlerin yazılacağı olay günlüğü klasörü (başlangıçta geçmiş buradan geri yüklenir)")
+    args = parser.parse_args()
+
+    if args.source == 'file':
+        if not args.path:
+            parser.error("--source file için --path gereklidir.")
+        source = JsonlFileSource(args.path, follow=not args.no_follow)
+    elif args.source == 'socket':
+        source = SocketSource(args.host, args.port)
+    else:
+        source = StdinSource()
+
+    assets = load_assets(OUTPUT_DIR, shard_id=args.shard_id)
+    run_stream(source, JsonlSink(args.sink), OffsetCheckpoint(args.checkpoint), StreamMetrics(args.metrics_path, assets['drift_monitor']),
+               assets, queue_maxsize=args.queue_size, event_log_dir=args.event_log_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# test_bulk_score.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+import preprocessing
+from bulk_score import build_sequences_vectorized
+from config import SEQUENCE_LENGTH
+
+
+def _history(row_counts, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for user_index, num_rows in enumerate(row_counts):
+        frames.append(pd.DataFrame({
+            'UserId': f'U{user_index}',
+            'CreatedAt': pd.Timestamp('2026-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 10**6, num_rows)), unit='s'),
+            'x': rng.normal(size=num_rows),
+            'c': rng.choice(['a', 'b', 'c'], num_rows),
+            'RiskScore': rng.random(num_rows)
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize('chunk_rows', [1000, 7]) # Tek parça ve dizi başı önceki parçaya taşan parçalar
+def test_vectorized_sequences_match_create_sequences(monkeypatch, chunk_rows):
+    # Kullanıcılardan bazılarının SEQUENCE_LENGTH'ten az girişi var (başı sıfırla doldurulur)
+    df = _history([1, SEQUENCE_LENGTH - 1, SEQUENCE_LENGTH, 13, 2, 20])
+    preprocessor = ColumnTransformer([('num', StandardScaler(), ['x']), ('cat', OneHotEncoder(), ['c'])],
+                                     sparse_threshold=1.0).fit(df[['x', 'c']])
+    target_scaler = StandardScaler().fit(df[['RiskScore']].to_numpy())
+
+    # Bölme devre dışı: create_sequences tüm dizileri satır sırasıyla döndürsün
+    monkeypatch.setattr(preprocessing, 'train_test_split', lambda X, y, **kwargs: (X, X[:0], y, y[:0]))
+    expected, _, _, _, _ = preprocessing.create_sequences(df, preprocessor, target_scaler, ['x'], ['c'])
+
+    user_ids = df['UserId'].to_numpy()
+    row_numbers = np.arange(len(df))
+    group_starts = np.maximum.accumulate(np.where(np.r_[True, user_ids[1:] != user_ids[:-1]], row_numbers, 0))
+    chunks = []
+    for chunk_start in range(0, len(df), chunk_rows):
+        chunk_end = min(chunk_start + chunk_rows, len(df))
+        processed_offset = max(chunk_start - (SEQUENCE_LENGTH - 1), 0)
+        processed = preprocessor.transform(df.iloc[processed_offset:chunk_end][['x', 'c']]).toarray()
+        chunks.append(build_sequences_vectorized(processed, group_starts, row_numbers[chunk_start:chunk_end], processed_offset))
+
+    np.testing.assert_allclose(np.concatenate(chunks), expected)
@@ -0,0 +1,168 @@
+# test_event_log.py
+
+import os
+
+import numpy as np
+import pytest
+
+import event_log as event_log_module
+from event_log import EventLog, encode_record, iter_event_log, _list_segments
+
+
+def _record(i, num_features=16):
+    features = np.zeros(num_features, dtype=np.float32)
+    features[i % num_features] = 1.0
+    features[(i * 7) % num_features] = -0.5 * i
+    raw_fields = {'UserId': f'U{i}', 'ClientIP': f'10.0.0.{i}', 'CreatedAt': f'2026-01-01T00:00:{i:02d}',
+                  'SourceOffset': i}
+    return raw_fields, features, i / 100.0, i / 50.0
+
+
+def _append(log_dir, records, **kwargs):
+    event_log = EventLog(str(log_dir), **kwargs)
+    try:
+        event_log.append_many(records)
+    finally:
+        event_log.close()
+
+
+def _assert_replayed(log_dir, expected):
+    replayed = list(iter_event_log(str(log_dir)))
+    assert len(replayed) == len(expected)
+    for record, (raw_fields, features, rule_score, model_score) in zip(replayed, expected):
+        assert record['raw'] == raw_fields
+        assert np.array_equal(record['features'], features)
+        assert record['rule_score'] == rule_score
+        assert record['model_score'] == model_score
+
+
+def test_append_reopen_and_replay(tmp_path):
+    records = [_record(i) for i in range(20)]
+    _append(tmp_path, records[:12])
+    _append(tmp_path, records[12:]) # Yeniden açılan günlük son segmente eklemeye devam eder
+    _assert_replayed(tmp_path, records)
+
+
+def test_segments_roll_and_replay_in_order(tmp_path):
+    records = [_record(i) for i in range(30)]
+    record_size = len(encode_record(*records[0]))
+    _append(tmp_path, records, segment_bytes=record_size * 4)
+    assert len(_list_segments(str(tmp_path))) > 1
+    _assert_replayed(tmp_path, records)
+
+
+def test_torn_tail_is_ignored_then_truncated_on_reopen(tmp_path):
+    records = [_record(i) for i in range(10)]
+    _append(tmp_path, records[:8])
+    segment_path = _list_segments(str(tmp_path))[-1]
+    valid_size = os.path.getsize(segment_path)
+
+    # Çökme: son kaydın yalnızca bir kısmı diske yazılmış
+    torn_record = encode_record(*_record(99))
+    with open(segment_path, 'ab') as f:
+        f.write(torn_record[:len(torn_record) // 2])
+    _assert_replayed(tmp_path, records[:8])
+
+    # Yeniden açılışta yarım kayıt kırpılır, yeni kayıtlar geçerli sona eklenir
+    _append(tmp_path, records[8:])
+    assert os.path.getsize(segment_path) == valid_size + sum(len(encode_record(*record)) for record in records[8:])
+    _assert_replayed(tmp_path, records)
+
+
+def test_corrupted_record_stops_replay_of_segment(tmp_path):
+    records = [_record(i) for i in range(6)]
+    _append(tmp_path, records)
+    segment_path = _list_segments(str(tmp_path))[-1]
+    corrupt_at = sum(len(encode_record(*record)) for record in records[:3]) + 12 # 4. kaydın yükü içinde
+
+    with open(segment_path, 'r+b') as f:
+        f.seek(corrupt_at)
+        byte = f.read(1)
+        f.seek(corrupt_at)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    _assert_replayed(tmp_path, records[:3])
+
+
+def _fail_once(monkeypatch, name, error, target=event_log_module, partial=False):
+    original = getattr(target, name)
+    state = {'failed': False}
+
+    def failing(*args):
+        if state['failed']:
+            return original(*args)
+        state['failed'] = True
+        if partial: # Yarım yazım: verinin ilk yarısı diske gider
+            f, data = args
+            original(f, bytes(data)[:len(data) // 2])
+        raise error
+
+    monkeypatch.setattr(target, name, failing)
+
+
+@pytest.mark.parametrize('name, partial', [('_write_all', False), ('_write_all', True)])
+def test_failed_write_is_rolled_back(tmp_path, monkeypatch, name, partial):
+    records = [_record(i) for i in range(9)]
+    event_log = EventLog(str(tmp_path))
+    try:
+        event_log.append_many(records[:3])
+        _fail_once(monkeypatch, name, OSError('disk hatası'), partial=partial)
+        with pytest.raises(OSError):
+            event_log.append_many(records[3:6])
+        event_log.append_many(records[6:])
+    finally:
+        event_log.close()
+    # Hata bildirilen kayıtlar kalıcı olmaz; sonraki kayıtlar yarım baytların arkasına yazılmaz
+    _assert_replayed(tmp_path, records[:3] + records[6:])
+
+
+def test_failed_fsync_is_rolled_back(tmp_path, monkeypatch):
+    records = [_record(i) for i in range(9)]
+    event_log = EventLog(str(tmp_path))
+    try:
+        event_log.append_many(records[:3])
+        _fail_once(monkeypatch, 'fsync', OSError('fsync hatası'), target=event_log_module.os)
+        with pytest.raises(OSError):
+            event_log.append_many(records[3:6])
+        event_log.append_many(records[6:])
+    finally:
+        event_log.close()
+    _assert_replayed(tmp_path, records[:3] + records[6:])
+
+
+def test_failed_roll_keeps_writer_alive(tmp_path, monkeypatch):
+    records = [_record(i) for i in range(12)]
+    record_size = len(encode_record(*records[0]))
+    event_log = EventLog(str(tmp_path), segment_bytes=record_size * 4)
+    try:
+        event_log.append_many(records[:2])
+        _fail_once(monkeypatch, '_roll_segment', ValueError('kapalı dosya'), target=EventLog)
+        with pytest.raises(ValueError):
+            event_log.append_many(records[2:8]) # Segment sınırını aşar
+        assert len(_list_segments(str(tmp_path))) == 1
+        event_log.append_many(records[8:]) # Yazıcı iş parçacığı hâlâ çalışıyor olmalı
+    finally:
+        event_log.close()
+    _assert_replayed(tmp_path, records[:2] + records[8:])
+
+
+def test_failure_after_roll_removes_new_segment(tmp_path, monkeypatch):
+    records = [_record(i) for i in range(12)]
+    record_size = len(encode_record(*records[0]))
+    event_log = EventLog(str(tmp_path), segment_bytes=record_size * 4)
+    try:
+        event_log.append_many(records[:2])
+        original_roll = EventLog._roll_segment
+
+        def roll_then_fail_writes(self):
+            original_roll(self)
+            _fail_once(monkeypatch, '_write_all', OSError('disk hatası'))
+
+        monkeypatch.setattr(EventLog, '_roll_segment', roll_then_fail_writes)
+        with pytest.raises(OSError):
+            event_log.append_many(records[2:8])
+        monkeypatch.setattr(EventLog, '_roll_segment', original_roll)
+        assert len(_list_segments(str(tmp_path))) == 1
+        event_log.append_many(records[8:])
+    finally:
+        event_log.close()
+    _assert_replayed(tmp_path, records[:2] + records[8:])
@@ -0,0 +1,65 @@
+# test_ip_enrichment.py
+
+import numpy as np
+
+from ip_enrichment import IpRangeIndex, UNKNOWN_NETWORK
+
+
+def _write_table(tmp_path, rows):
+    path = tmp_path / 'ip_ranges.csv'
+    path.write_text('cidr,asn,country,network_type\n' + '\n'.join(rows) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def _asns(index, ips):
+    return index.lookup(np.array(ips, dtype=object))[0].tolist()
+
+
+def test_nested_ranges_resolve_to_narrowest(tmp_path):
+    index = IpRangeIndex.from_csv(_write_table(tmp_path, [
+        '10.0.0.0/8,1,TR,isp',
+        '10.1.2.0/24,3,TR,corporate', # Dosyada /16'dan önce gelse de sıralama bağımsız olmalı
+        '10.1.0.0/16,2,TR,isp',
+        '10.1.0.0/24,4,TR,hosting', # /16 ile aynı başlangıç
+    ]))
+
+    assert _asns(index, [
+        '10.0.0.0', '10.0.255.255',
+        '10.1.0.0', '10.1.0.255', '10.1.1.0',
+        '10.1.2.0', '10.1.2.255', '10.1.3.0', '10.1.255.255',
+        '10.2.0.0', '10.255.255.255', '11.0.0.0', '9.255.255.255'
+    ]) == [1, 1, 4, 4, 2, 3, 3, 2, 2, 1, 1, 0, 0]
+
+    # Parçalar sıralı ve çakışmasız olmalı (searchsorted buna dayanır)
+    assert (index.starts <= index.ends).all()
+    assert (index.starts[1:] > index.ends[:-1]).all()
+
+
+def test_duplicate_cidr_keeps_one_segment(tmp_path):
+    index = IpRangeIndex.from_csv(_write_table(tmp_path, [
+        '192.168.0.0/16,100,TR,isp',
+        '192.168.1.0/24,200,TR,corporate',
+        '192.168.1.0/24,300,TR,hosting',
+    ]))
+
+    asns, _, network_types = index.lookup(np.array(['192.168.1.7', '192.168.0.1', '192.168.2.1'], dtype=object))
+    # Aynı aralık iki kez verilirse dosyada sonra gelen geçerlidir
+    assert asns.tolist() == [300, 100, 100]
+    assert network_types.tolist() == ['hosting', 'isp', 'isp']
+    assert len(index.starts) == 3
+    assert (index.starts[1:] > index.ends[:-1]).all()
+
+
+def test_asn_prefix_and_invalid_rows(tmp_path):
+    index = IpRangeIndex.from_csv(_write_table(tmp_path, [
+        '1.1.1.0/24,AS13335,US,hosting',
+        '8.8.8.0/24,15169,US,hosting',
+        '9.9.9.0/24,,CH,hosting',
+        '4.4.4.0/24,ASX,US,isp',
+        '2001:db8::/32,64496,US,isp',
+        '5.5.5.0/33,64497,US,isp',
+    ]))
+
+    asns, countries, _ = index.lookup(np.array(['1.1.1.1', '8.8.8.8', '9.9.9.9', '4.4.4.4', '5.5.5.5'], dtype=object))
+    assert asns.tolist() == [13335, 15169, 0, 0, 0]
+    assert countries.tolist() == ['US', 'US', UNKNOWN_NETWORK, UNKNOWN_NETWORK, UNKNOWN_NETWORK]
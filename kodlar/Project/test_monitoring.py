@@ -0,0 +1,132 @@
+# test_monitoring.py
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+from monitoring import DriftMonitor, HyperLogLog, population_stability_index, ks_statistic, _hash64
+
+NUMERICAL_FEATURES = ['x', 'CreatedAt_Hour', 'CreatedAt_Month']
+CATEGORICAL_FEATURES = ['c']
+DAY = 86400
+
+
+def _entries(num_rows, seed, x_shift=0.0, hour=None, month=None, categories=('a', 'b', 'c')):
+    rng = np.random.default_rng(seed)
+    scores = rng.random(num_rows)
+    return pd.DataFrame({
+        'x': rng.normal(x_shift, 1.0, num_rows),
+        'CreatedAt_Hour': rng.integers(0, 24, num_rows) if hour is None else np.full(num_rows, hour),
+        'CreatedAt_Month': rng.integers(1, 13, num_rows) if month is None else np.full(num_rows, month),
+        'c': rng.choice(list(categories), num_rows),
+        'RiskScore': scores
+    }), scores
+
+
+@pytest.fixture
+def monitor_and_preprocessor():
+    df, scores = _entries(5000, seed=0)
+    preprocessor = ColumnTransformer([
+        ('num', StandardScaler(), NUMERICAL_FEATURES),
+        ('cat', OneHotEncoder(handle_unknown='ignore'), CATEGORICAL_FEATURES)
+    ], sparse_threshold=0.0).fit(df[NUMERICAL_FEATURES + CATEGORICAL_FEATURES])
+    monitor = DriftMonitor.from_training(df, NUMERICAL_FEATURES, CATEGORICAL_FEATURES, preprocessor, scores, scores)
+    return monitor, preprocessor
+
+
+def _feed(monitor, preprocessor, entries, scores, start, duration):
+    # Girişler [start, start + duration) aralığına yayılarak 100'lük partiler halinde verilir
+    for batch_start in range(0, len(entries), 100):
+        batch = entries.iloc[batch_start:batch_start + 100]
+        now = start + duration * (batch_start + len(batch)) / len(entries)
+        monitor.update(batch, preprocessor.transform(batch[NUMERICAL_FEATURES + CATEGORICAL_FEATURES]),
+                       scores[batch_start:batch_start + 100], now=now)
+    return start + duration
+
+
+def _alerted(report):
+    return {(alert['feature'], alert['metric'], alert.get('window')) for alert in report['alerts']}
+
+
+def test_psi_and_ks():
+    reference = np.array([0.25, 0.25, 0.25, 0.25])
+    assert population_stability_index(reference, np.array([10.0, 10.0, 10.0, 10.0])) == pytest.approx(0.0)
+    assert ks_statistic(reference, np.array([10.0, 10.0, 10.0, 10.0])) == pytest.approx(0.0)
+    live = np.array([40.0, 0.0, 0.0, 0.0])
+    assert population_stability_index(reference, live) > 1.0
+    assert ks_statistic(reference, live) == pytest.approx(0.75)
+    assert population_stability_index(reference, np.zeros(4)) is None
+
+
+def test_hyperloglog_estimate():
+    sketch = HyperLogLog()
+    for value in range(20000):
+        sketch.add(_hash64(value))
+    assert sketch.estimate() == pytest.approx(20000, rel=0.05)
+
+
+def test_in_distribution_traffic_does_not_alert(monitor_and_preprocessor):
+    monitor, preprocessor = monitor_and_preprocessor
+    entries, scores = _entries(3000, seed=1)
+    now = _feed(monitor, preprocessor, entries, scores, start=0.0, duration=3 * DAY)
+    report = monitor.report(now=now)
+    assert report['totalEvents'] == 3000
+    assert report['alerts'] == []
+    assert report['numerical']['x']['psi'] < 0.05
+    assert report['categorical']['c']['unknownRate'] == 0.0
+
+
+def test_numerical_shift_alerts_and_decays(monitor_and_preprocessor):
+    monitor, preprocessor = monitor_and_preprocessor
+    shifted, shifted_scores = _entries(2000, seed=2, x_shift=2.0)
+    now = _feed(monitor, preprocessor, shifted, shifted_scores, start=0.0, duration=DAY)
+    assert ('x', 'psi', None) in _alerted(monitor.report(now=now))
+
+    # Birkaç yarı ömür normal trafikten sonra eski kayma rapora yansımaz
+    entries, scores = _entries(2000, seed=3)
+    now = _feed(monitor, preprocessor, entries, scores, start=now, duration=3 * DAY)
+    report = monitor.report(now=now)
+    assert ('x', 'psi', None) not in _alerted(report)
+    assert report['effectiveEvents'] < 2000
+
+
+def test_unknown_categories_are_counted(monitor_and_preprocessor):
+    monitor, preprocessor = monitor_and_preprocessor
+    entries, scores = _entries(1000, seed=4, categories=('a', 'z1', 'z2'))
+    entries.loc[entries.index[:50], 'c'] = [f'new{i}' for i in range(50)]
+    now = _feed(monitor, preprocessor, entries, scores, start=0.0, duration=3600)
+    report = monitor.report(now=now)['categorical']['c']
+    assert report['unknownRate'] > 0.6
+    assert report['distinctUnknownValues'] == pytest.approx(52, abs=2)
+    assert {top['value'] for top in report['topUnknownValues'][:2]} == {'z1', 'z2'}
+    assert ('c', 'unknownRate', None) in _alerted(monitor.report(now=now))
+
+
+def test_calendar_features_alert_on_cycle_window(monitor_and_preprocessor):
+    monitor, preprocessor = monitor_and_preprocessor
+    entries, scores = _entries(8000, seed=5)
+    now = _feed(monitor, preprocessor, entries, scores, start=0.0, duration=28 * DAY)
+    report = monitor.report(now=now)
+    assert report['alerts'] == []
+    assert report['numerical']['CreatedAt_Hour']['cycle']['psi'] < 0.05
+    assert report['numerical']['CreatedAt_Month']['alertExempt']
+
+    # Üç gün boyunca tüm girişler 03:00'te ve aynı ayda: saat alarm verir, ay yalnızca raporlanır
+    shifted, shifted_scores = _entries(3000, seed=6, hour=3, month=7)
+    now = _feed(monitor, preprocessor, shifted, shifted_scores, start=now, duration=3 * DAY)
+    report = monitor.report(now=now)
+    assert ('CreatedAt_Hour', 'psi', 'cycle') in _alerted(report)
+    assert not any(alert['feature'] == 'CreatedAt_Month' for alert in report['alerts'])
+    assert report['numerical']['CreatedAt_Month']['psi'] > 1.0
+
+
+def test_pickle_round_trip_keeps_live_state(monitor_and_preprocessor):
+    monitor, preprocessor = monitor_and_preprocessor
+    entries, scores = _entries(500, seed=7)
+    now = _feed(monitor, preprocessor, entries, scores, start=0.0, duration=3600)
+    restored = pickle.loads(pickle.dumps(monitor))
+    assert restored.report(now=now) == monitor.report(now=now)
@@ -0,0 +1,56 @@
+# test_profile_builder.py
+
+import numpy as np
+import pandas as pd
+
+from profile_builder import ProfileStore, PROFILE_FIELDS
+
+
+def _history(num_users=5, rows_per_user=30, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for user_index in range(num_users):
+        created_at = pd.Timestamp('2026-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 200 * 86400, rows_per_user)), unit='s')
+        for timestamp in created_at:
+            rows.append({
+                'UserId': f'U{user_index}',
+                'CreatedAt': timestamp,
+                # Kullanıcı başına PROFILE_IP_BLOCK_SLOTS'tan az blok: yuvalar dolmadığında iki yol birebir aynı olmalı
+                'ClientIP': f'10.{user_index}.{rng.integers(0, 3)}.{rng.integers(1, 255)}',
+                'MFAMethod': rng.choice(['SMS_OTP', 'App_Auth', 'Email_OTP'], p=[0.6, 0.3, 0.1]),
+                'Application': rng.choice(['AppA', 'AppB']),
+                'Browser': rng.choice(['Chrome', 'Firefox', 'Safari']),
+                'OS': rng.choice(['Windows', 'macOS']),
+                'Unit': rng.choice(['HR', 'Finance']),
+                'Title': rng.choice(['Manager', 'Analyst'])
+            })
+    return pd.DataFrame(rows)
+
+
+def _assert_same_store(store, expected):
+    assert store.to_dict() == expected.to_dict()
+    for user_id in expected:
+        row, expected_row = store._user_index[user_id], expected._user_index[user_id]
+        for field in PROFILE_FIELDS:
+            counts = dict(zip(store._vocab_values[field], store._counts[field][row]))
+            expected_counts = dict(zip(expected._vocab_values[field], expected._counts[field][expected_row]))
+            assert counts.keys() == expected_counts.keys()
+            np.testing.assert_allclose([counts[value] for value in expected_counts], list(expected_counts.values()), rtol=1e-4)
+        np.testing.assert_allclose(store._hour_counts[row], expected._hour_counts[expected_row], rtol=1e-4, atol=1e-6)
+
+
+def test_from_history_matches_incremental_updates():
+    df = _history()
+    incremental = ProfileStore()
+    incremental.update_from_entries(df)
+    _assert_same_store(ProfileStore.from_history(df), incremental)
+
+
+def test_missing_values_are_not_counted():
+    df = _history(num_users=2)
+    df.loc[df.index[::3], 'MFAMethod'] = None
+    incremental = ProfileStore()
+    incremental.update_from_entries(df)
+    from_history = ProfileStore.from_history(df)
+    _assert_same_store(from_history, incremental)
+    assert None not in from_history._vocab_values['preferred_mfa']
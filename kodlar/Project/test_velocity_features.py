@@ -0,0 +1,67 @@
+# test_velocity_features.py
+
+import pickle
+
+import pytest
+
+from velocity_features import VelocityTracker, VELOCITY_FEATURES
+
+
+def _features(values):
+    return dict(zip(VELOCITY_FEATURES, values))
+
+
+def test_window_eviction_updates_distinct_counts():
+    tracker = VelocityTracker(window_seconds=3600, max_events=64)
+    tracker.update('U1', 0, '10.0.0.', 'Chrome/Windows')
+    tracker.update('U1', 600, '10.0.1.', 'Firefox/Linux')
+    features = _features(tracker.update('U1', 1200, '10.0.0.', 'Chrome/Windows'))
+    assert features['velocity_logins_window'] == 3
+    assert features['velocity_distinct_ip_blocks_window'] == 2
+    assert features['velocity_distinct_devices_window'] == 2
+
+    # 600. saniyedeki giriş pencereden çıkınca onun bloğu ve cihazı da sayılmaz
+    features = _features(tracker.update('U1', 4300, '10.0.0.', 'Chrome/Windows'))
+    assert features['velocity_logins_window'] == 2
+    assert features['velocity_distinct_ip_blocks_window'] == 1
+    assert features['velocity_distinct_devices_window'] == 1
+    assert features['velocity_hours_since_last_login'] == pytest.approx((4300 - 1200) / 3600)
+
+
+def test_ring_buffer_drops_oldest_event():
+    tracker = VelocityTracker(window_seconds=3600, max_events=3)
+    for i in range(4):
+        features = _features(tracker.update('U1', i * 10, f'10.0.{i}.', 'Chrome/Windows'))
+    assert features['velocity_logins_window'] == 3
+    assert features['velocity_distinct_ip_blocks_window'] == 3
+
+
+def test_first_login_and_users_are_independent():
+    tracker = VelocityTracker(window_seconds=3600, max_gap_hours=48)
+    tracker.update('U1', 0, '10.0.0.', 'Chrome/Windows')
+    features = _features(tracker.update('U2', 10, '10.0.0.', 'Chrome/Windows'))
+    assert features['velocity_logins_window'] == 1
+    assert features['velocity_hours_since_last_login'] == 48 # İlk giriş: üst sınır
+    assert features['velocity_login_rate_ratio'] == 1.0
+
+
+def test_login_rate_ratio_uses_rate_before_current_login():
+    tracker = VelocityTracker(window_seconds=3600, gap_ewma_alpha=0.1)
+    timestamp = 0
+    for _ in range(5): # Olağan hız: 2 saatte bir giriş
+        tracker.update('U1', timestamp, '10.0.0.', 'Chrome/Windows')
+        timestamp += 7200
+    for _ in range(3): # Ani artış: dakikada bir
+        timestamp += 60
+        features = _features(tracker.update('U1', timestamp, '10.0.0.', 'Chrome/Windows'))
+    assert features['velocity_logins_window'] == 3
+    assert features['velocity_login_rate_ratio'] > 2.5
+
+
+def test_pickle_round_trip_keeps_state():
+    tracker = VelocityTracker(window_seconds=3600)
+    tracker.update('U1', 0, '10.0.0.', 'Chrome/Windows')
+    restored = pickle.loads(pickle.dumps(tracker))
+    features = _features(restored.update('U1', 60, '10.0.1.', 'Chrome/Windows'))
+    assert features['velocity_logins_window'] == 2
+    assert features['velocity_distinct_ip_blocks_window'] == 2
@@ -0,0 +1,140 @@
+# velocity_features.py
+
+import threading
+from collections import deque
+
+import numpy as np
+
+from config import VELOCITY_WINDOW_SECONDS, VELOCITY_MAX_EVENTS, VELOCITY_GAP_EWMA_ALPHA, VELOCITY_MAX_GAP_HOURS
+from feature_engineering import epoch_seconds
+
+# Kayan pencere (sliding window) davranış özellikleri; sıra VelocityTracker.update dönüş sırasıyla aynıdır
+VELOCITY_FEATURES = [
+    'velocity_logins_window',              # Penceredeki giriş sayısı (mevcut giriş dahil)
+    'velocity_distinct_ip_blocks_window',  # Penceredeki farklı ClientIP_Block sayısı
+    'velocity_distinct_devices_window',    # Penceredeki farklı Browser/OS ikilisi sayısı
+    'velocity_hours_since_last_login',     # Bir önceki girişten bu yana geçen saat (üst sınırlı)
+    'velocity_login_rate_ratio'            # Penceredeki giriş sayısının kullanıcının olağan hızına oranı
+]
+
+
+class _UserVelocityState:
+    """
+    Tek bir kullanıcının pencere içindeki girişleri (halka tampon) ve sayaçları.
+    """
+    __slots__ = ('events', 'ip_block_counts', 'device_counts', 'last_timestamp', 'gap_ewma')
+
+    def __init__(self, max_events):
+        self.events = deque(maxlen=max_events) # (zaman damgası, ip bloğu, cihaz)
+        self.ip_block_counts = {}
+        self.device_counts = {}
+        self.last_timestamp = None
+        self.gap_ewma = None # Girişler arası sürenin üstel hareketli ortalaması (saniye)
+
+
+def _decrement(counts, key):
+    if counts[key] == 1:
+        del counts[key]
+    else:
+        counts[key] -= 1
+
+
+class VelocityTracker:
+    """
+    Kullanıcı başına kayan pencere özelliklerini olay başına O(1) (amorti) güncellemeyle tutar.
+    Hem eğitim (add_velocity_features) hem servis aynı nesneyi kullandığı için iki taraf ayrışmaz.
+    Olaylar her kullanıcı için zaman sırasıyla verilmelidir.
+    """
+
+    def __init__(self, window_seconds=VELOCITY_WINDOW_SECONDS, max_events=VELOCITY_MAX_EVENTS,
+                 gap_ewma_alpha=VELOCITY_GAP_EWMA_ALPHA, max_gap_hours=VELOCITY_MAX_GAP_HOURS):
+        self.window_seconds = window_seconds
+        self.max_events = max_events
+        self.gap_ewma_alpha = gap_ewma_alpha
+        self.max_gap_hours = max_gap_hours
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock'] # Kilit pickle edilemez
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _evict_oldest(self, state):
+        _, old_ip_block, old_device = state.events.popleft()
+        _decrement(state.ip_block_counts, old_ip_block)
+        _decrement(state.device_counts, old_device)
+
+    def update(self, user_id, timestamp, ip_block, device):
+        """
+        Girişi kullanıcının durumuna ekler ve bu giriş için özellik değerlerini döndürür.
+        timestamp saniye cinsindendir (Unix zamanı).
+        """
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is None:
+                state = self._states[user_id] = _UserVelocityState(self.max_events)
+
+            # Pencere dışına çıkan girişleri at; tampon doluysa en eskisini çıkar
+            while state.events and timestamp - state.events[0][0] > self.window_seconds:
+                self._evict_oldest(state)
+            if len(state.events) == self.max_events:
+                self._evict_oldest(state)
+
+            if state.last_timestamp is None:
+                gap_seconds = None
+                hours_since_last_login = self.max_gap_hours
+            else:
+                gap_seconds = max(timestamp - state.last_timestamp, 0.0) # Sıra dışı olaylarda negatif olmasın
+                hours_since_last_login = min(gap_seconds / 3600.0, self.max_gap_hours)
+
+            state.events.append((timestamp, ip_block, device))
+            state.ip_block_counts[ip_block] = state.ip_block_counts.get(ip_block, 0) + 1
+            state.device_counts[device] = state.device_counts.get(device, 0) + 1
+            logins_in_window = len(state.events)
+
+            # Olağan hız, mevcut giriş eklenmeden önceki ortalamadan hesaplanır (ani artış kendini normalleştirmesin)
+            if state.gap_ewma:
+                expected_logins_in_window = max(self.window_seconds / state.gap_ewma, 1.0)
+                login_rate_ratio = logins_in_window / expected_logins_in_window
+            else:
+                login_rate_ratio = 1.0
+
+            if gap_seconds is not None:
+                if state.gap_ewma is None:
+                    state.gap_ewma = gap_seconds
+                else:
+                    state.gap_ewma = self.gap_ewma_alpha * gap_seconds + (1 - self.gap_ewma_alpha) * state.gap_ewma
+            state.last_timestamp = max(timestamp, state.last_timestamp or timestamp)
+
+            return (logins_in_window, len(state.ip_block_counts), len(state.device_counts),
+                    hours_since_last_login, login_rate_ratio)
+
+    def subset(self, user_ids):
+        """
+        Yalnızca verilen kullanıcıların durumunu içeren yeni bir izleyici döndürür.
+        """
+        tracker = VelocityTracker(self.window_seconds, self.max_events, self.gap_ewma_alpha, self.max_gap_hours)
+        tracker._states = {user_id: self._states[user_id] for user_id in user_ids if user_id in self._states}
+        return tracker
+
+
+def add_velocity_features(df, velocity_tracker):
+    """
+    DataFrame'in satır sırasıyla (kullanıcı başına zaman sıralı olmalı) izleyiciyi günceller ve
+    VELOCITY_FEATURES sütunlarını ekler. ClientIP_Block sütunu önceden eklenmiş olmalıdır.
+    """
+    timestamps = epoch_seconds(df['CreatedAt'])
+    devices = (df['Browser'] + '/' + df['OS']).to_numpy()
+    values = np.zeros((len(df), len(VELOCITY_FEATURES)))
+
+    for i, (user_id, ip_block) in enumerate(zip(df['UserId'].to_numpy(), df['ClientIP_Block'].to_numpy())):
+        values[i] = velocity_tracker.update(user_id, timestamps[i], ip_block, devices[i])
+
+    for j, col_name in enumerate(VELOCITY_FEATURES):
+        df[col_name] = values[:, j]
+    return df